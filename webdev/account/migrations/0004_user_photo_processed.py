@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_alter_user_photo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='photo_processed',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Изображение обработано'),
+        ),
+    ]
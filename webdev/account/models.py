@@ -7,14 +7,13 @@ from easy_thumbnails.fields import ThumbnailerImageField
 
 
 class User(AbstractUser):
+    # уменьшается после загрузки задачей process_uploaded_image (UPLOAD_RESIZE_OPTIONS)
     photo = ThumbnailerImageField(upload_to='account/%Y/%m/%d/',
                                   blank=True,
                                   null=True,
                                   verbose_name='Изображение',
-                                  default=settings.DEFAULT_USER_IMAGE,
-                                  resize_source=dict(quality=98,
-                                                     size=(64, 64),
-                                                     sharpen=True))
+                                  default=settings.DEFAULT_USER_IMAGE)
+    photo_processed = models.BooleanField(default=True, editable=False, verbose_name='Изображение обработано')
     following = models.ManyToManyField('self',
                                        related_name='followers',
                                        symmetrical=False,
@@ -81,7 +81,8 @@ class ProfileUserView(LoginRequiredMixin, generic.DetailView):
         profile_user_pk = kwargs['object'].pk
         last_user_posts = cache.get(f'last_user_posts_{profile_user_pk}')
         if not last_user_posts:
-            last_user_posts = services.all_objects(kwargs['object'].blog_posts)[:5]
+            last_user_posts = services.all_objects(kwargs['object'].blog_posts,
+                                                   **services.POST_LIST_PROJECTION)[:5]
             cache.set('last_user_posts', last_user_posts)
         context['username_posts'] = last_user_posts
         context['default_image'] = settings.DEFAULT_USER_IMAGE
@@ -0,0 +1,59 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination, PageNumberPagination
+
+
+class CursorOrOffsetPagination(CursorPagination):
+    """
+    Пагинация по курсору. Пагинация по смещению (с подсчетом COUNT)
+    используется, только если клиент явно передал параметр limit или offset
+    """
+
+    offset_pagination_class = LimitOffsetPagination
+    offset_paginator = None
+
+    def use_offset_pagination(self, request) -> bool:
+        params = (self.offset_pagination_class.limit_query_param,
+                  self.offset_pagination_class.offset_query_param)
+        return any(param in request.query_params for param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_offset_pagination(request):
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + \
+            self.offset_pagination_class().get_schema_operation_parameters(view)
+
+
+class PostPagination(CursorOrOffsetPagination):
+    """Пагинация постов по индексу (-publish, -id)"""
+
+    ordering = ('-publish', '-id')
+
+
+class CommentPagination(CursorOrOffsetPagination):
+    """Пагинация комментариев по индексу (-created, -id)"""
+
+    ordering = ('-created', '-id')
+
+
+class UserPagination(CursorOrOffsetPagination):
+    """Пагинация пользователей по первичному ключу"""
+
+    ordering = ('id',)
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Постраничная пагинация результатов поиска. Пагинируется список id,
+    ограниченный SEARCH_RESULTS_LIMIT, а не запрос к таблице постов
+    """
+
+    page_size = settings.SEARCH_RESULTS_PER_PAGE
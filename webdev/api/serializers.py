@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Manager
 from rest_framework import serializers
 
 from services import services, redis_services
@@ -38,6 +39,19 @@ class UserDetailSerializer(serializers.ModelSerializer):
                   'last_name', 'email', 'photo', 'blog_posts',  'comments', 'following')
 
 
+class PostListBatchSerializer(serializers.ListSerializer):
+    """Сериализатор страницы постов, получающий просмотры всех постов пакетными запросами к Redis"""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, Manager) else data)
+        views = redis_services.get_views_many(post.pk for post in posts)
+        unique_views = redis_services.get_unique_views_many(post.pk for post in posts)
+        for post in posts:
+            post.total_views = views[post.pk]
+            post.unique_views = unique_views[post.pk]
+        return super().to_representation(posts)
+
+
 class PostListSerializer(serializers.ModelSerializer):
     """Сериализатор списка постов"""
 
@@ -49,16 +63,43 @@ class PostListSerializer(serializers.ModelSerializer):
         model = Post
         fields = ('id', 'title', 'author', 'cat',
                   'title_image', 'publish',)
+        list_serializer_class = PostListBatchSerializer
 
     def to_representation(self, instance):
         """Добавление количества комментариев и просмотров поста"""
 
         representation = super().to_representation(instance)
-        representation['comments'] = instance.comments.count()
-        representation['views'] = redis_services.get_views(instance.id)
+        representation['comments'] = instance.comment_count
+        if hasattr(instance, 'total_views'):
+            representation['views'] = instance.total_views
+            representation['unique_views'] = instance.unique_views
+        else:
+            representation['views'] = redis_services.get_views(instance.id)
+            representation['unique_views'] = redis_services.get_unique_views(instance.id)
         return representation
 
 
+class PostSearchSerializer(serializers.ModelSerializer):
+    """Сериализатор результата поиска: вместо тела поста фрагмент текста с совпадениями"""
+
+    author = serializers.ReadOnlyField(source='author.username')
+    cat = serializers.ReadOnlyField(source='cat.cat_title')
+    headline = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ('id', 'title', 'author', 'cat',
+                  'title_image', 'publish', 'headline')
+
+
+class PostAutocompleteSerializer(serializers.Serializer):
+    """Сериализатор подсказки автодополнения заголовка поста"""
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    url = serializers.CharField()
+
+
 class PostDetailSerializer(serializers.ModelSerializer):
     """Сериализатор одного поста"""
 
@@ -89,6 +130,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
 
         representation = super().to_representation(instance)
         representation['views'] = redis_services.get_views(instance.id)
+        representation['unique_views'] = redis_services.get_unique_views(instance.id)
         return representation
 
 
@@ -9,6 +9,7 @@ from . import serializers
 from api.serializers import CategoryDetailSerializer, TagDetailSerializer, UserDetailSerializer, \
     CommentDetailSerializer, PostDetailSerializer
 from post.models import Post, Category, Tag, Comment
+from services import redis_services
 
 
 class CategoryListTest(APITestCase):
@@ -231,6 +232,14 @@ class UserListTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
 
+    def test_user_list_logged_cursor_next_page(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_token.key)
+        response = self.client.get(reverse('api:user-list'))
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
     def test_create_new_user_not_logged(self):
         data = {'username': 'User 1', 'email': 'user1@mail.ru', 'password1': '12345', 'password2': '12345'}
         response = self.client.post(reverse('api:user-list'), data)
@@ -326,6 +335,13 @@ class CommentListTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_comment_list_cursor_next_page(self):
+        response = self.client.get(reverse('api:comment-list'))
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
     def test_create_new_comment_not_logged(self):
         data = {'body': 'New comment to post', 'post': self.post}
         response = self.client.post(reverse('api:comment-list'), data)
@@ -430,11 +446,63 @@ class PostViewSetTest(APITestCase):
         # проверка кол-ва записей на одной странице
         self.assertEqual(len(response.data['results']), 5)
 
+    def test_post_list_not_modified_after_login(self):
+        etag = self.client.get(reverse('api:post-list'))['ETag']
+        self.client.login(username='test_user2', password='12345')
+        self.client.logout()
+        response = self.client.get(reverse('api:post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_post_list_modified_after_author_rename(self):
+        etag = self.client.get(reverse('api:post-list'))['ETag']
+        self.user1.username = 'renamed_user'
+        self.user1.save()
+        response = self.client.get(reverse('api:post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_post_list_next_page(self):
         response = self.client.get(reverse('api:post-list') + '?offset=5')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_post_list_cursor_next_page(self):
+        response = self.client.get(reverse('api:post-list'))
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_post_list_views(self):
+        response = self.client.get(reverse('api:post-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for post in response.data['results']:
+            self.assertEqual(post['views'], redis_services.get_views(post['id']))
+
+    def test_post_search(self):
+        response = self.client.get(reverse('api:post-search'), {'q': 'text'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 6)
+        self.assertNotIn('body', response.data['results'][0])
+        self.assertIn('<mark>text</mark>', response.data['results'][0]['headline'].lower())
+
+    def test_post_autocomplete(self):
+        response = self.client.get(reverse('api:post-autocomplete'), {'q': 'title 3'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'url'})
+        self.assertEqual(response.data[0]['url'],
+                         Post.objects.get(slug='post_title_3').get_absolute_url())
+
+    def test_post_autocomplete_short_query(self):
+        response = self.client.get(reverse('api:post-autocomplete'), {'q': 'po'})
+        self.assertEqual(response.data, [])
+
+    def test_post_search_empty_query(self):
+        response = self.client.get(reverse('api:post-search'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+
     def test_create_new_post_not_logged(self):
         data = {
             'title': 'Post title 10',
@@ -465,6 +533,22 @@ class PostViewSetTest(APITestCase):
         self.assertEqual(response.json().get('title'), self.post.title)
         self.assertEqual(serializer_data, response.data)
 
+    def test_post_detail_not_modified(self):
+        url = reverse('api:post-detail', args=(self.post.pk,))
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Comment.objects.create(post=self.post, author=self.user2, body='New comment')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_post_list_not_modified(self):
+        url = reverse('api:post-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_post_update_not_logged(self):
         data = {'body': 'Updated text in post'}
         response = self.client.put(reverse('api:post-detail', args=(self.post.pk,)), data)
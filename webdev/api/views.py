@@ -1,14 +1,14 @@
 from django.contrib.auth import get_user_model
 from rest_framework import permissions, viewsets, mixins
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from slugify import slugify
-
 from post.models import Post, Comment, Category, Tag
-from services import services, redis_services
+from services import services, cache_services, redis_services, search_services
 from . import serializers
+from .pagination import PostPagination, CommentPagination, UserPagination, SearchPagination
 from .permissions import IsOwnerOrAdminUserOrReadOnly, IsAdminOrReadOnly, IsOwnerOrReadOnly
 
 
@@ -21,6 +21,8 @@ class UserViewSet(mixins.ListModelMixin,
     Набор представлений для модели User
     """
 
+    pagination_class = UserPagination
+
     def get_queryset(self):
         if self.action == 'list':
             return services.all_objects(get_user_model().objects)
@@ -64,12 +66,12 @@ class PostViewSet(viewsets.ModelViewSet):
 
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrAdminUserOrReadOnly)
+    pagination_class = PostPagination
 
     def get_queryset(self):
         if self.action == 'list':
             return services.all_objects(Post.published,
-                                        select_related=('author', 'cat'),
-                                        prefetch_related=('comments',))
+                                        **services.POST_LIST_PROJECTION)
         elif self.action == 'retrieve':
             return services.all_objects(Post.published,
                                         select_related=('author', 'cat'),
@@ -86,14 +88,65 @@ class PostViewSet(viewsets.ModelViewSet):
         return serializers.PostCreateSerializer
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user,
-                        slug=slugify(self.request.data['title']))
+        services.create_post_serializer(serializer, self.request.user)
+
+    def get_etag(self, *version) -> str:
+        """ETag ответа: версия ресурса, формат ответа и пользователь (для Browsable API)"""
+
+        return cache_services.make_etag(*version, self.request.accepted_renderer.format, self.request.user.pk)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список постов, версия которого складывается из поколений таблиц постов и категорий
+        и версии полей авторов: вход, профиль и подписки пользователей ее не меняют
+        """
+
+        tables = sorted(model._meta.db_table for model in (Post, Category))
+        generations = cache_services.get_generations(tables)
+        etag = self.get_etag(*(generations[table] for table in tables), cache_services.get_authors_version())
+        response = cache_services.get_not_modified_response(request, etag)
+        if response is not None:
+            return response
+        return cache_services.set_validators(super().list(request, *args, **kwargs), etag)
 
     def retrieve(self, request, *args, **kwargs):
+        validators = services.get_post_validators(Post.published,
+                                                  pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        etag = last_modified = None
+        if validators is not None:
+            etag = self.get_etag(*validators['version'])
+            last_modified = validators['last_modified']
+            response = cache_services.get_not_modified_response(request, etag, last_modified)
+            if response is not None:
+                redis_services.incr_views(validators['pk'], services.get_visitor_id(request))
+                return response
+
         instance = self.get_object()
         serializer = self.get_serializer(instance)
-        redis_services.incr_views(instance.id)
-        return Response(serializer.data)
+        redis_services.incr_views(instance.id, services.get_visitor_id(request))
+        return cache_services.set_validators(Response(serializer.data), etag, last_modified)
+
+    @action(detail=False, methods=['get'], pagination_class=SearchPagination)
+    def search(self, request):
+        """Полнотекстовый поиск по постам: /search/?q=запрос, результаты по убыванию релевантности"""
+
+        query = request.query_params.get('q', '').strip()
+        post_ids, fuzzy = search_services.search_post_ids(query) if query else ([], False)
+        page = self.paginate_queryset(post_ids)
+        results = search_services.get_search_results(query, page)
+        serializer = serializers.PostSearchSerializer(results,
+                                                      many=True,
+                                                      context=self.get_serializer_context())
+        response = self.get_paginated_response(serializer.data)
+        response.data['fuzzy'] = fuzzy
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def autocomplete(self, request):
+        """Подсказки заголовков постов по мере ввода: /autocomplete/?q=начало заголовка"""
+
+        suggestions = search_services.autocomplete_posts(request.query_params.get('q', ''))
+        return Response(serializers.PostAutocompleteSerializer(suggestions, many=True).data)
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -102,6 +155,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     """
 
     queryset = services.all_objects(Comment.objects)
+    pagination_class = CommentPagination
 
     def get_serializer_class(self):
         if self.action in ('list', 'create'):
@@ -116,11 +170,14 @@ class CommentViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        services.create_comment_serializer(serializer, self.request.user)
 
     def perform_update(self, serializer):
         post = services.get_instance_by_unique_field(Post, pk=int(self.request.data['post']))
-        serializer.save(post=post)
+        services.update_comment_serializer(serializer, post)
+
+    def perform_destroy(self, instance):
+        services.delete_comment(instance)
 
 
 # class CommentListAPIView(generics.ListCreateAPIView):
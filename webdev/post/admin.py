@@ -1,7 +1,13 @@
+from functools import partial
+
 from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models.functions import Length
 from django_summernote.admin import SummernoteModelAdmin
 
+from services import services, cache_services
 from .models import Post, Comment, Category, Tag
+from .tasks import fan_out_post
 
 
 @admin.register(Post)
@@ -16,18 +22,33 @@ class PostAdmin(SummernoteModelAdmin):
     actions = ['set_status', 'del_status']
     summernote_fields = ('body',)
 
-    @admin.display(description='Краткое описание', ordering='text')
+    def get_queryset(self, request):
+        # длина текста считается в БД, сам текст в списке постов не загружается
+        return super().get_queryset(request)\
+                      .defer(*services.POST_HEAVY_FIELDS)\
+                      .annotate(body_length=Length('body'))
+
+    @admin.display(description='Краткое описание', ordering='body_length')
     def brief_info(self, post: Post):
-        return f'Описание {len(post.body)} символов.'
+        return f'Описание {post.body_length} символов.'
 
     @admin.action(description='Опубликовать выбранные Посты')
     def set_status(self, request, queryset):
+        post_ids = list(queryset.values_list('pk', flat=True))
+        draft_ids = list(queryset.exclude(status=Post.Status.PUBLISHED).values_list('pk', flat=True))
         count = queryset.update(status=Post.Status.PUBLISHED)
+        cache_services.invalidate(cache_services.posts_changed, post_ids)
+        cache_services.invalidate(cache_services.bump_generation, Post)
+        for post_id in draft_ids:
+            transaction.on_commit(partial(fan_out_post.delay, post_id))
         self.message_user(request, f'Изменено {count} Постов')
 
     @admin.action(description='Снять с публикации выбранные Посты')
     def del_status(self, request, queryset):
+        post_ids = list(queryset.values_list('pk', flat=True))
         count = queryset.update(status=Post.Status.DRAFT)
+        cache_services.invalidate(cache_services.posts_changed, post_ids)
+        cache_services.invalidate(cache_services.bump_generation, Post)
         self.message_user(request, f'{count} Постов снято с публикации', messages.WARNING)
 
 
@@ -35,6 +56,21 @@ class PostAdmin(SummernoteModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['author', 'post', 'body']
 
+    def save_model(self, request, obj, form, change):
+        old_post_id = form.initial.get('post') if change else None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                services.comment_added(obj)
+            elif old_post_id != obj.post_id:
+                services.refresh_comment_counters({old_post_id, obj.post_id})
+
+    def delete_model(self, request, obj):
+        services.delete_comment(obj)
+
+    def delete_queryset(self, request, queryset):
+        services.delete_comments(queryset)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -1,9 +1,10 @@
 import random
 
 from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
-from post.models import Post, Category, Comment, Tag
+from post.models import Post, Category, Comment, Tag, make_excerpt
 from account.models import User
 
 
@@ -55,6 +56,7 @@ class Command(BaseCommand):
         posts = [Post(title=f'Заголовок{i}',
                       slug=f'zagolovok{i}',
                       author_id=random.choice(users_ids_list),
+                      excerpt=make_excerpt(post_template['body']),
                       **post_template) for i in range(1, 101)]
         Post.objects.bulk_create(posts)
 
@@ -77,3 +79,6 @@ class Command(BaseCommand):
             post.tags.set(random_tag_ids)
             post.save()
 
+        # Пересчет денормализованных счетчиков комментариев постов
+        call_command('rebuild_comment_counts')
+
@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from services import image_services
+
+
+def generate(task: tuple) -> tuple:
+    """Создает миниатюры одного изображения в процессе пула, возвращает (имя, количество, ошибка)"""
+
+    model_label, field_name, name = task
+    model = apps.get_model(model_label)
+    fieldfile = getattr(model(**{field_name: name}), field_name)
+    try:
+        return name, image_services.generate_aliases(fieldfile), None
+    except Exception as error:
+        return name, 0, error
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры всех изображений по алиасам THUMBNAIL_ALIASES в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*',
+                            help='Поля изображений вида app_label.Model.field (по умолчанию все)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Количество процессов')
+        parser.add_argument('--chunk-size', type=int, default=20,
+                            help='Количество изображений, передаваемых процессу за раз')
+
+    def handle(self, *args, **options):
+        fields = image_services.get_image_fields()
+        if options['targets']:
+            fields = [(model, field_name) for model, field_name in fields
+                      if f'{model._meta.label}.{field_name}' in options['targets']]
+            if not fields:
+                raise CommandError('Поля изображений не найдены')
+
+        # процессы пула создаются fork: у каждого будут свои соединения с БД
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+            for model, field_name in fields:
+                total = 0
+                results = pool.imap_unordered(generate,
+                                              self.get_tasks(model, field_name),
+                                              chunksize=options['chunk_size'])
+                for name, count, error in results:
+                    if error is not None:
+                        self.stderr.write(f'{name}: {error}')
+                    total += count
+                self.stdout.write(self.style.SUCCESS(
+                    f'{model._meta.label}.{field_name}: создано {total} миниатюр'))
+
+    @staticmethod
+    def get_tasks(model, field_name):
+        """
+        Имена файлов изображений поля без повторов (например, изображение по умолчанию).
+        Необработанные загрузки пропускаются: миниатюры создаст process_uploaded_image
+        """
+
+        queryset = model._default_manager.exclude(**{f'{field_name}__isnull': True})\
+                                         .exclude(**{field_name: ''})
+        flag = image_services.get_processed_flag(field_name)
+        if any(field.name == flag for field in model._meta.get_fields()):
+            queryset = queryset.filter(**{flag: True})
+        names = queryset.order_by(field_name).values_list(field_name, flat=True).distinct()
+        for name in names.iterator():
+            yield model._meta.label, field_name, name
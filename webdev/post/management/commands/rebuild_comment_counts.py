@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services import services
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество комментариев и время последнего комментария всех постов'
+
+    def handle(self, *args, **options):
+        count = services.refresh_comment_counters()
+        self.stdout.write(self.style.SUCCESS(f'Обновлены счетчики комментариев {count} постов'))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from account.models import User
+from post.tasks import rebuild_timeline
+from services import redis_services
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает ленты подписок в Redis и список авторов, посты которых подмешиваются при чтении'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='id пользователей (по умолчанию все пользователи с подписками)')
+
+    def handle(self, *args, **options):
+        authors = User.objects.annotate(followers_count=Count('followers'))\
+                              .filter(followers_count__gt=0)\
+                              .values_list('id', 'followers_count')
+        for author_id, followers_count in authors.iterator(chunk_size=1000):
+            redis_services.set_celebrity(author_id,
+                                         followers_count > settings.TIMELINE_CELEBRITY_THRESHOLD)
+
+        users = User.objects.filter(following__isnull=False).distinct()
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+        total = 0
+        for user_id in users.values_list('id', flat=True).iterator(chunk_size=1000):
+            rebuild_timeline(user_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Перестроено лент: {total}'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from post.models import Post
+from post.tasks import sync_post_views
+from services import redis_services
+
+
+class Command(BaseCommand):
+    help = 'Согласует счетчики просмотров в Redis и поле Post.view_count, оставляя большее значение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество постов, обрабатываемых за раз')
+
+    def handle(self, *args, **options):
+        # Перенос в БД просмотров, еще не учтенных в Post.view_count
+        sync_post_views()
+
+        batch = {}
+        for pk, view_count in Post.objects.order_by('pk')\
+                                          .values_list('pk', 'view_count')\
+                                          .iterator(chunk_size=options['batch_size']):
+            batch[pk] = view_count
+            if len(batch) == options['batch_size']:
+                self.restore(batch)
+                batch = {}
+        self.restore(batch)
+        self.stdout.write(self.style.SUCCESS('Счетчики просмотров восстановлены'))
+
+    @staticmethod
+    def restore(db_views: dict) -> None:
+        """
+        Записывает большее из значений Redis и БД в оба хранилища: после потери
+        данных Redis счетчики восстанавливаются из БД, а просмотры, накопленные
+        в Redis до появления Post.view_count, переносятся в БД
+        """
+
+        if not db_views:
+            return
+        redis_views = redis_services.get_views_many(db_views)
+        views = {pk: max(count, redis_views[pk]) for pk, count in db_views.items()}
+        redis_services.set_views_many({pk: count for pk, count in views.items() if count > redis_views[pk]})
+        Post.objects.bulk_update([Post(pk=pk, view_count=count)
+                                  for pk, count in views.items() if count > db_views[pk]],
+                                 ['view_count'],
+                                 batch_size=500)
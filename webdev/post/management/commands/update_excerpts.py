@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from post.models import Post, make_excerpt
+from services import cache_services
+
+
+class Command(BaseCommand):
+    help = 'Заполняет анонсы постов (для постов, созданных до появления поля excerpt или без save())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество постов, обновляемых одним запросом')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+        while True:
+            posts = list(Post.objects.filter(pk__gt=last_pk)
+                                     .order_by('pk')
+                                     .only('pk', 'body')[:batch_size])
+            if not posts:
+                break
+            for post in posts:
+                post.excerpt = make_excerpt(post.body)
+            total += Post.objects.bulk_update(posts, ['excerpt'])
+            last_pk = posts[-1].pk
+        cache_services.posts_changed()
+        self.stdout.write(self.style.SUCCESS(f'Обновлены анонсы {total} постов'))
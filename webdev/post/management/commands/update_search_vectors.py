@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from post.models import Post, post_search_vector
+from services import cache_services
+
+
+class Command(BaseCommand):
+    help = 'Заполняет поисковый вектор постов (для постов, созданных до появления триггера)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество постов, обновляемых одним запросом')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+        while True:
+            pks = list(Post.objects.filter(pk__gt=last_pk)
+                                   .order_by('pk')
+                                   .values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            total += Post.objects.filter(pk__in=pks).update(search_vector=post_search_vector())
+            last_pk = pks[-1]
+        cache_services.bump_posts_corpus_version()
+        self.stdout.write(self.style.SUCCESS(f'Обновлен поисковый вектор {total} постов'))
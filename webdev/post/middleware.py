@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.utils.translation import get_language
+
+from services import cache_services, redis_services
+from services.services import get_visitor_id
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кеширование страниц целиком для анонимных посетителей.
+
+    Кешируются только успешные ответы на GET-запросы, для которых представление
+    указало метки зависимостей в request.page_cache_tags (см. PageCacheMixin).
+    Ключ страницы включает хост, язык, путь и строку запроса. Страницы удаляются
+    из кеша по меткам при изменении постов, категорий, тегов и комментариев
+    (cache_services.purge_pages), блок наиболее обсуждаемых постов в сайдбаре
+    может устареть не более чем на PAGE_CACHE_TIMEOUT.
+    При отдаче детальной страницы поста из кеша учитывается просмотр поста,
+    условные запросы к закешированной странице получают ответ 304
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+
+        key = cache_services.make_key('page',
+                                      request.get_host(),
+                                      get_language(),
+                                      request.get_full_path())
+        entry = cache.get(key)
+        if entry is not None:
+            response, post_id = entry
+            if post_id is not None:
+                redis_services.incr_views(post_id, get_visitor_id(request))
+            response['X-Page-Cache'] = 'HIT'
+            return get_conditional_response(request,
+                                            etag=response.get('ETag'),
+                                            last_modified=parse_http_date_safe(response.get('Last-Modified')),
+                                            response=response)
+
+        response = self.get_response(request)
+        tags = getattr(request, 'page_cache_tags', None)
+        if tags and self.is_cacheable_response(response):
+            cache.set(key, (response, getattr(request, 'page_cache_post_id', None)),
+                      settings.PAGE_CACHE_TIMEOUT)
+            redis_services.tag_page(key, tags, settings.PAGE_CACHE_TIMEOUT)
+            response['X-Page-Cache'] = 'MISS'
+        return response
+
+    @staticmethod
+    def is_cacheable_request(request) -> bool:
+        return settings.PAGE_CACHE_ENABLED and request.method == 'GET' and not request.user.is_authenticated
+
+    @staticmethod
+    def is_cacheable_response(response) -> bool:
+        return response.status_code == 200 and not response.streaming and not response.cookies
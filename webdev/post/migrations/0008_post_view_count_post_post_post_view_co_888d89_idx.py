@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0007_alter_comment_options_alter_post_title_image_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-view_count'], name='post_post_view_co_888d89_idx'),
+        ),
+    ]
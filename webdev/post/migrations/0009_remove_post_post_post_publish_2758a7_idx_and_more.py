@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_post_view_count_post_post_post_view_co_888d89_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_post_publish_2758a7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-publish', '-id'], name='post_post_publish_502cd5_idx'),
+        ),
+    ]
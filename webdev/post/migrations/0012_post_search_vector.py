@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Триггер поддерживает поисковый вектор при любом INSERT/UPDATE заголовка или текста,
+# в том числе при массовых обновлениях через QuerySet.update() и bulk_create().
+# Конфигурация 'russian' и веса совпадают с post.models.post_search_vector()
+CREATE_TRIGGER_SQL = '''
+CREATE FUNCTION post_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.body, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER post_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, body ON post_post
+    FOR EACH ROW EXECUTE FUNCTION post_post_search_vector_update();
+'''
+
+DROP_TRIGGER_SQL = '''
+DROP TRIGGER IF EXISTS post_post_search_vector_trigger ON post_post;
+DROP FUNCTION IF EXISTS post_post_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0011_post_comment_count_post_last_commented_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='post_post_search__afdb24_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0014_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='title_image_processed',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Превью обработано'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.shortcuts import get_object_or_404
 
+from services import cache_services, redis_services
 from .models import Post, Comment
+from .pagination import KeysetPaginator
 
 
 class IsPostOwnerOrAdminMixin(UserPassesTestMixin):
@@ -14,3 +16,93 @@ class IsCommentOwnerOrAdminMixin(UserPassesTestMixin):
     def test_func(self):
         comment = get_object_or_404(Comment, pk=self.kwargs['pk'])
         return self.request.user.is_superuser or self.request.user == comment.author
+
+
+class PostViewsMixin:
+    """
+    Добавляет постам текущей страницы счетчики просмотров,
+    полученные одним запросом к Redis
+    """
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        posts = context['object_list']
+        views = redis_services.get_views_many(post.pk for post in posts)
+        for post in posts:
+            post.total_views = views[post.pk]
+        return context
+
+
+class KeysetPaginationMixin:
+    """
+    Постраничный вывод постов по курсору (-publish, -id) вместо OFFSET
+    """
+
+    paginator_class = KeysetPaginator
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.paginator_class(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class PageCacheMixin:
+    """
+    Разрешает кеширование страницы для анонимных посетителей
+    (AnonymousPageCacheMiddleware) с метками объектов, от которых она зависит.
+    Метка sidebar есть у всех страниц: категории, теги, обсуждаемые посты
+    и число постов выводятся в сайдбарах (см. cache_services.bump_sidebar_stamps)
+    """
+
+    page_cache_tags = ('posts',)
+
+    def get_page_cache_tags(self) -> set:
+        return set(self.page_cache_tags)
+
+    def render_to_response(self, context, **response_kwargs):
+        self.request.page_cache_tags = self.get_page_cache_tags() | {'sidebar'}
+        return super().render_to_response(context, **response_kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы (ETag / Last-Modified): если страница у клиента
+    не изменилась, возвращается 304 без запросов страницы и рендеринга шаблона.
+    Версия страницы включает пользователя, так как от него зависят меню и права
+    """
+
+    def get_version(self):
+        """Части версии страницы или None, если ETag не используется"""
+
+        return None
+
+    def get_last_modified(self):
+        """Время последнего изменения страницы или None"""
+
+        return None
+
+    def not_modified(self) -> None:
+        """Вызывается перед отдачей ответа 304"""
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version()
+        etag = cache_services.make_etag(*version, request.user.pk) if version is not None else None
+        last_modified = self.get_last_modified()
+        response = cache_services.get_not_modified_response(request, etag, last_modified)
+        if response is not None:
+            self.not_modified()
+            return response
+        response = super().get(request, *args, **kwargs)
+        return cache_services.set_validators(response, etag, last_modified)
+
+
+class PostListVersionMixin(ConditionalGetMixin):
+    """
+    Версия списка постов: версия корпуса опубликованных постов и штампы сайдбаров.
+    Счетчики просмотров в версию не входят
+    """
+
+    def get_version(self):
+        return (cache_services.get_posts_corpus_version(),
+                cache_services.get_sidebar_stamp('categories', 'tags', 'top-posts', 'posts'))
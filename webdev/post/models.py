@@ -1,11 +1,39 @@
+import re
+from html import unescape
+
 from account.models import User
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 
 from easy_thumbnails.fields import ThumbnailerImageField
 
 
+def post_search_vector():
+    """Поисковый вектор поста, в котором заголовок весит больше текста"""
+
+    return SearchVector('title', weight='A', config=settings.SEARCH_CONFIG) + \
+        SearchVector('body', weight='B', config=settings.SEARCH_CONFIG)
+
+
+# закрывающие теги блоков и переносы строк, после которых в тексте поста нужен пробел
+BLOCK_END_RE = re.compile(r'(</(?:p|div|li|h[1-6]|blockquote|pre|td|th)>|<br\s*/?>)', re.IGNORECASE)
+
+
+def make_excerpt(body: str) -> str:
+    """Анонс поста: первые POST_EXCERPT_WORDS слов текста поста без HTML-разметки"""
+
+    text = strip_tags(BLOCK_END_RE.sub(r'\1 ', body or ''))
+    text = ' '.join(unescape(text).split())
+    return Truncator(text).words(settings.POST_EXCERPT_WORDS)
+
+
 class PublishedModel(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(status='PB')
@@ -39,26 +67,39 @@ class Post(BaseContent):
                             null=True,
                             related_name='posts',
                             verbose_name='Категория')
+    # уменьшается после загрузки задачей process_uploaded_image (UPLOAD_RESIZE_OPTIONS)
     title_image = ThumbnailerImageField(upload_to='post/%Y/%m/%d/',
                                         blank=True,
                                         null=True,
-                                        verbose_name='Превью',
-                                        resize_source=dict(quality=95,
-                                                           size=(1600, 856),
-                                                           sharpen=True))
+                                        verbose_name='Превью')
+    title_image_processed = models.BooleanField(default=True, editable=False, verbose_name='Превью обработано')
     publish = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=2,
                               choices=Status.choices,
                               default='PB',
                               verbose_name='Статус')
     tags = models.ManyToManyField('Tag', related_name='posts', blank=True)
+    view_count = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Комментарии')
+    last_commented_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний комментарий')
+    # вычисляется из body при сохранении, для постов, созданных без save(), - командой update_excerpts
+    excerpt = models.TextField(blank=True, editable=False, verbose_name='Анонс')
+    # заполняется триггером БД при изменении title или body (см. миграцию 0012)
+    search_vector = SearchVectorField(null=True, editable=False)
     objects = models.Manager()
     published = PublishedModel()
 
     class Meta:
         ordering = ['-publish']
         indexes = [
-            models.Index(fields=['-publish'])  # параметр индекс-ния
+            models.Index(fields=['-publish', '-id']),  # параметр индекс-ния
+            models.Index(fields=['-view_count']),
+            models.Index(fields=['-comment_count']),
+            GinIndex(fields=['search_vector']),
+            # триграммные индексы: нечеткий поиск по заголовку (title %> запрос)
+            # и автодополнение (UPPER(title) LIKE UPPER('%запрос%'))
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='post_title_trgm_idx'),
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='post_title_upper_trgm_idx'),
         ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
@@ -66,6 +107,14 @@ class Post(BaseContent):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if 'body' not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.body)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'body' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('post_detail', args=[self.publish.day,
                                             self.publish.month,
@@ -86,7 +135,7 @@ class Comment(BaseContent):
     class Meta:
         ordering = ['-created']
         indexes = [
-            models.Index(fields=['created'])  # параметр индекс-ния
+            models.Index(fields=['-created', '-id'])  # параметр индекс-ния
         ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
@@ -0,0 +1,136 @@
+import base64
+import binascii
+import hashlib
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """
+    Страница постов, полученная по ключу (publish, id) последнего
+    просмотренного поста, а не по смещению
+    """
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor('next', self.object_list[-1], self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor('prev', self.object_list[0], self.number - 1)
+
+
+class KeysetPaginator:
+    """
+    Пагинатор постов по ключу (-publish, -id).
+    Стоимость запроса любой страницы не зависит от ее номера,
+    общее количество постов кешируется и вычисляется только по требованию
+    """
+
+    ordering = ('-publish', '-pk')
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    def page(self, cursor=None) -> KeysetPage:
+        """Возвращает страницу, на которую указывает курсор, или первую страницу"""
+
+        if not cursor:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, 1,
+                              has_next=len(rows) > self.per_page,
+                              has_previous=False)
+
+        direction, publish, pk, number = self.decode_cursor(cursor)
+        if direction == 'next':
+            queryset = self.queryset.filter(Q(publish__lt=publish) | Q(publish=publish, pk__lt=pk))\
+                                    .order_by(*self.ordering)
+        else:
+            queryset = self.queryset.filter(Q(publish__gt=publish) | Q(publish=publish, pk__gt=pk))\
+                                    .order_by('publish', 'pk')
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'next':
+            if not rows:
+                raise Http404('Страница не найдена')
+            return KeysetPage(rows, self, number, has_next=has_more, has_previous=True)
+        rows.reverse()
+        return KeysetPage(rows, self, max(number, 1), has_next=True, has_previous=has_more)
+
+    @staticmethod
+    def encode_cursor(direction: str, post, number: int) -> str:
+        """Кодирует направление, ключ поста и номер целевой страницы в непрозрачный курсор"""
+
+        payload = json.dumps([direction, post.publish.isoformat(), post.pk, number])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """Декодирует курсор, при некорректном курсоре возвращает 404"""
+
+        try:
+            direction, publish, pk, number = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            publish = parse_datetime(publish)
+            if direction not in ('next', 'prev') or publish is None:
+                raise ValueError
+            return direction, publish, int(pk), int(number)
+        except (binascii.Error, UnicodeError, TypeError, ValueError):
+            raise Http404('Некорректный курсор страницы')
+
+    @cached_property
+    def count(self) -> int:
+        """Общее количество постов, кешируется на POSTS_COUNT_CACHE_TIMEOUT секунд"""
+
+        queryset = self.queryset.order_by()
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            # заведомо пустой запрос (например, пустая лента подписок)
+            return 0
+        key = 'posts_count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.POSTS_COUNT_CACHE_TIMEOUT)
+        return count
+
+    @property
+    def num_pages(self) -> int:
+        return max(math.ceil(self.count / self.per_page), 1)
@@ -0,0 +1,139 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from account.models import User
+from services import cache_services, image_services, services
+from .models import Post, Category, Tag, Comment
+from .tasks import fan_out_post, process_uploaded_image
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """Создание, изменение, публикация и удаление поста меняют корпус постов и сайдбары"""
+
+    cache_services.invalidate(cache_services.posts_changed, [instance.pk])
+
+
+@receiver(pre_save, sender=Post)
+def post_publishing(sender, instance, **kwargs):
+    """Запоминает, был ли пост опубликован до сохранения"""
+
+    instance._was_published = not instance._state.adding and \
+        Post.objects.filter(pk=instance.pk, status=Post.Status.PUBLISHED).exists()
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, **kwargs):
+    """Публикация поста (создание опубликованным или снятие статуса черновика) рассылает его по лентам"""
+
+    was_published = instance.__dict__.pop('_was_published', False)
+    if instance.status == Post.Status.PUBLISHED and not was_published:
+        transaction.on_commit(partial(fan_out_post.delay, instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    cache_services.invalidate(cache_services.bump_sidebar_stamps, 'categories')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    cache_services.invalidate(cache_services.bump_sidebar_stamps, 'tags')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """Комментарии меняют порядок наиболее обсуждаемых постов и число комментариев в списках постов"""
+
+    cache_services.invalidate(cache_services.bump_sidebar_stamps, 'top-posts')
+    cache_services.invalidate(cache_services.purge_pages, 'posts', f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=User)
+def model_changed(sender, **kwargs):
+    """
+    Изменение строки делает недействительными кешированные запросы к ее таблице.
+    Поколения ведутся только для таблиц, из которых строятся кешируемые запросы
+    """
+
+    cache_services.invalidate(cache_services.bump_generation, sender)
+
+
+@receiver(pre_save, sender=User)
+def author_changing(sender, instance, update_fields=None, **kwargs):
+    """Запоминает выводимые вместе с постами поля автора до сохранения"""
+
+    if instance._state.adding or \
+            update_fields is not None and not set(update_fields) & set(services.POST_AUTHOR_FIELDS):
+        return
+    instance._author_fields = sender.objects.filter(pk=instance.pk)\
+                                            .values(*services.POST_AUTHOR_FIELDS)\
+                                            .first()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, **kwargs):
+    """
+    Изменение пользователя меняет кешированные запросы постов, только если изменились
+    поля автора: вход (last_login), профиль и подписки их не затрагивают
+    """
+
+    author_fields = instance.__dict__.pop('_author_fields', None)
+    if author_fields is not None and \
+            author_fields != {field: getattr(instance, field) for field in services.POST_AUTHOR_FIELDS}:
+        cache_services.invalidate(cache_services.bump_generation, sender)
+        cache_services.invalidate(cache_services.bump_authors_version)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def m2m_relation_changed(sender, instance, model, action, **kwargs):
+    """Изменение тегов поста меняет промежуточную таблицу и обе связанные таблицы"""
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        for changed_model in (sender, Post, Tag):
+            cache_services.invalidate(cache_services.bump_generation, changed_model)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, pk_set, **kwargs):
+    """Изменение тегов поста меняет его страницу и списки постов по тегам"""
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        post_ids = [instance.pk] if isinstance(instance, Post) else (pk_set or ())
+        cache_services.invalidate(cache_services.purge_pages, 'posts', *(f'post:{pk}' for pk in post_ids))
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=User)
+def image_uploading(sender, instance, **kwargs):
+    """Загруженные изображения сохраняются без обработки и помечаются необработанными"""
+
+    instance._uploaded_images = image_services.mark_uploaded_images(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=User)
+def image_uploaded(sender, instance, **kwargs):
+    """Обработка загруженных изображений ставится в очередь после фиксации транзакции"""
+
+    for field_name in instance.__dict__.pop('_uploaded_images', ()):
+        transaction.on_commit(partial(process_uploaded_image.delay,
+                                      sender._meta.label,
+                                      instance.pk,
+                                      field_name,
+                                      getattr(instance, field_name).name))
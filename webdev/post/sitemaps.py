@@ -9,7 +9,8 @@ class PostSitemap(Sitemap):
     priority = 0.9
 
     def items(self):
-        return services.all_objects(Post.published)
+        return services.all_objects(Post.published,
+                                    **services.POST_LIST_PROJECTION)
 
     def lastmod(self, obj):
         return obj.updated
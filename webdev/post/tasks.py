@@ -1,57 +1,242 @@
-from django.core.mail import send_mail
-from django.db.models import Count
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Max, Min
 from datetime import datetime, timedelta
+from smtplib import SMTPException
 import os
+import uuid
 
 from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
 
 from account.models import User
+from services import cache_services, image_services, redis_services
 from .models import Post
 
 
 @shared_task
 def post_created(post_slug: str) -> None:
     """
-    Задача, уведомляющая по почте подписчика о публикации нового поста автора
+    Задача, уведомляющая по почте подписчиков о публикации нового поста автора.
+    Адреса подписчиков читаются из БД потоком и рассылаются пачками подзадач send_mail_chunk
     """
 
-    post = Post.objects.get(slug=post_slug)
+    post = Post.objects.select_related('author').get(slug=post_slug)
     subject = f'Новый пост'
     message = f'Пользователь {post.author} опубликовал новую статью.\n' \
               f'Читать http://webdev.com{post.get_absolute_url()}'
-    for follower in post.author.followers.all():
-        send_mail(subject,
-                  message,
-                  os.getenv('EMAIL_HOST_USER'),
-                  [follower.email])
+    emails = post.author.followers.exclude(email='').values_list('email', flat=True)
+    send_mail_chunks(subject, message, emails)
+
+
+def send_mail_chunks(subject: str, message: str, emails) -> int:
+    """
+    Разбивает поток адресов на пачки по MAIL_CHUNK_SIZE и ставит
+    в очередь отправку каждой пачки. Возвращает количество пачек
+    """
+
+    chunks = 0
+    chunk = []
+    for email in emails.iterator(chunk_size=settings.MAIL_CHUNK_SIZE):
+        chunk.append(email)
+        if len(chunk) == settings.MAIL_CHUNK_SIZE:
+            send_mail_chunk.delay(subject, message, chunk)
+            chunks += 1
+            chunk = []
+    if chunk:
+        send_mail_chunk.delay(subject, message, chunk)
+        chunks += 1
+    return chunks
+
+
+def send_mail_each(subject: str, message: str, recipients):
+    """
+    Отправляет письмо каждому адресату отдельным сообщением через одно SMTP-соединение,
+    возвращая адресатов по одному сразу после отправки им письма
+    """
+
+    with get_connection() as connection:
+        for email in recipients:
+            connection.send_messages([EmailMessage(subject, message, os.getenv('EMAIL_HOST_USER'), [email])])
+            yield email
+
+
+@shared_task(bind=True,
+             max_retries=5,
+             rate_limit=settings.MAIL_CHUNK_RATE_LIMIT)
+def send_mail_chunk(self, subject: str, message: str, recipients: list) -> int:
+    """
+    Задача, отправляющая письмо пачке адресатов через одно SMTP-соединение.
+    При ошибке SMTP задача повторяется только для адресатов, которым письмо
+    еще не отправлено. Возвращает количество отправленных писем
+    """
+
+    sent = 0
+    try:
+        for _ in send_mail_each(subject, message, recipients):
+            sent += 1
+    except (SMTPException, OSError) as exc:
+        raise self.retry(args=(subject, message, recipients[sent:]),
+                         exc=exc,
+                         countdown=get_exponential_backoff_interval(factor=1,
+                                                                    retries=self.request.retries,
+                                                                    maximum=600,
+                                                                    full_jitter=True))
+    return sent
+
+
+DIGEST_SUBJECT = 'Возможно, Вам будет это интересно'
 
 
 @shared_task()
-def send_beat_email() -> None:
+def send_beat_email(run_id: str = None) -> None:
     """
     Периодическая задача, отправляющая раз в неделю всем пользователям
-    3 самых обсуждаемых поста за прошедший период
+    3 самых обсуждаемых поста за прошедший период.
+    Письмо формируется один раз на запуск (run_id, по умолчанию ISO-неделя),
+    пользователи разбиваются на диапазоны pk, каждый диапазон отправляется
+    отдельной задачей. Повторный запуск с тем же run_id отправляет только
+    неотправленные диапазоны
     """
 
+    if run_id is None:
+        year, week, _ = timezone.localdate().isocalendar()
+        run_id = f'{year}-W{week:02d}'
+
+    message = redis_services.get_digest_message(run_id)
+    if message is None:
+        message = redis_services.set_digest_message(run_id, get_digest_message())
+
+    pk_range = User.objects.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+    if pk_range['min_pk'] is None:
+        return
+    done = redis_services.get_done_digest_batches(run_id)
+    for start in range(pk_range['min_pk'], pk_range['max_pk'] + 1, settings.DIGEST_BATCH_SIZE):
+        if start not in done:
+            send_digest_batch.delay(run_id, start, start + settings.DIGEST_BATCH_SIZE, message)
+
+
+def get_digest_message() -> str:
+    """Формирует текст письма с тремя самыми обсуждаемыми постами прошедшей недели"""
+
     date_week_ago = datetime.now() - timedelta(days=7)
 
     # Запрос трех наиболее обсуждаемых постов за прошедшую неделю
     most_commented_posts = Post.published.filter(publish__gt=date_week_ago) \
-                               .annotate(num_comments=Count('comments')) \
-                               .order_by('-num_comments')[:3]
+                               .order_by('-comment_count') \
+                               .only('title', 'slug', 'publish')[:3]
 
     # Формирование списка в формате post.title: link
     posts_in_title_link_format = [f'{post.title}: http://webdev.com{post.get_absolute_url()}\n'
                                   for post in most_commented_posts]
 
-    message = f'Самые обсуждаемые посты прошедшей недели:\n' \
-              f'{''.join(posts_in_title_link_format)}'
+    return f'Самые обсуждаемые посты прошедшей недели:\n' \
+           f'{''.join(posts_in_title_link_format)}'
+
+
+@shared_task(bind=True,
+             autoretry_for=(SMTPException, OSError),
+             retry_backoff=True,
+             max_retries=5,
+             rate_limit=settings.MAIL_CHUNK_RATE_LIMIT,
+             acks_late=True,
+             reject_on_worker_lost=True)
+def send_digest_batch(self, run_id: str, start: int, end: int, message: str) -> None:
+    """
+    Задача, отправляющая письмо рассылки run_id пользователям с pk из [start, end)
+    через одно SMTP-соединение. Пачка, уже отправленная или отправляемая
+    другой задачей, пропускается.
+    Задача подтверждается брокеру только после выполнения: пачка, воркер которой
+    упал, доставляется повторно. Повтор (после ошибки или падения воркера)
+    отправляет письмо только адресатам, которым оно еще не отправлено
+    """
 
-    for user in User.objects.all():
-        send_mail(
-            'Возможно, Вам будет это интересно',
-            message,
-            os.getenv('EMAIL_HOST_USER'),
-            [user.email]
-        )
+    owner = self.request.id or uuid.uuid4().hex
+    if not redis_services.claim_digest_batch(run_id, start, owner):
+        return
+    sent = redis_services.get_sent_digest_emails(run_id, start)
+    emails = [email for email in User.objects.filter(pk__gte=start, pk__lt=end)
+                                             .exclude(email='')
+                                             .values_list('email', flat=True)
+              if email not in sent]
+    try:
+        for email in send_mail_each(DIGEST_SUBJECT, message, emails):
+            redis_services.add_sent_digest_email(run_id, start, email)
+    except Exception:
+        redis_services.release_digest_batch(run_id, start, owner)
+        raise
+    redis_services.complete_digest_batch(run_id, start)
+
+
+@shared_task
+def sync_post_views() -> None:
+    """
+    Периодическая задача, переносящая накопленные в Redis просмотры постов
+    в поле Post.view_count
+    """
+
+    pending_views = redis_services.get_pending_views()
+    if pending_views:
+        posts = [Post(pk=pk, view_count=F('view_count') + count)
+                 for pk, count in pending_views.items()]
+        Post.objects.bulk_update(posts, ['view_count'], batch_size=500)
+    redis_services.clear_pending_views()
+
+
+@shared_task
+def fan_out_post(post_id: int) -> None:
+    """
+    Задача, добавляющая новый пост в ленты подписчиков автора.
+    Посты авторов, у которых подписчиков больше TIMELINE_CELEBRITY_THRESHOLD,
+    не рассылаются, а подмешиваются в ленту при ее чтении
+    """
+
+    post = Post.published.filter(pk=post_id).values('author_id', 'publish').first()
+    if post is None:
+        return
+
+    followers = User.objects.filter(following=post['author_id'])
+    is_celebrity = followers.count() > settings.TIMELINE_CELEBRITY_THRESHOLD
+    redis_services.set_celebrity(post['author_id'], is_celebrity)
+    if is_celebrity:
+        return
+
+    score = post['publish'].timestamp()
+    batch = []
+    for follower_id in followers.values_list('id', flat=True).iterator(chunk_size=settings.TIMELINE_FAN_OUT_BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) == settings.TIMELINE_FAN_OUT_BATCH_SIZE:
+            redis_services.push_to_timelines(batch, post_id, score)
+            batch = []
+    redis_services.push_to_timelines(batch, post_id, score)
+
+
+@shared_task
+def rebuild_timeline(user_id: int) -> None:
+    """
+    Задача, строящая ленту пользователя из БД: последние TIMELINE_MAX_LENGTH
+    постов авторов, на которых он подписан
+    """
+
+    posts = Post.published.filter(author__followers=user_id)\
+                          .order_by('-publish', '-id')\
+                          .values_list('id', 'publish')[:settings.TIMELINE_MAX_LENGTH]
+    redis_services.set_timeline(user_id, {pk: publish.timestamp() for pk, publish in posts})
+
+
+@shared_task
+def process_uploaded_image(model_label: str, pk: int, field_name: str, name: str) -> None:
+    """
+    Задача, уменьшающая загруженное изображение вне запроса (UPLOAD_RESIZE_OPTIONS)
+    и создающая его миниатюры по всем алиасам THUMBNAIL_ALIASES.
+    До ее завершения вместо миниатюр изображения выводится заглушка
+    """
 
+    model = apps.get_model(model_label)
+    if not image_services.resize_uploaded_image(model, pk, field_name, name):
+        return
+    if model is Post:
+        cache_services.bump_generation(model)
+        cache_services.posts_changed([pk])
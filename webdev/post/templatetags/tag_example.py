@@ -1,43 +1,69 @@
 from django import template
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from services.redis_services import r
+from django.templatetags.static import static
+from easy_thumbnails.templatetags.thumbnail import thumbnail_url
+from services import cache_services, image_services, redis_services
 from django.db.models import Count
-from django.core.cache import cache
+from django.core.cache import caches
 
 from ..models import Post, Category, Tag
 
 
 register = template.Library()
 
+sidebar_cache = caches['sidebar']
+
 
 @register.inclusion_tag('post/post/list_categories.html')
 def show_categories():
-    cats_lst = cache.get('cats')
-    if not cats_lst:
-        cats_lst = Category.objects.annotate(total=Count("posts")).filter(total__gt=0)
-        cache.set('cats', cats_lst, 60)
-    return {'cats': cats_lst}
+    rows = cache_services.get_or_compute(
+        'categories:' + cache_services.get_sidebar_stamp('categories'),
+        lambda: list(Category.objects.annotate(total=Count("posts"))
+                                     .filter(total__gt=0)
+                                     .values_list('cat_title', 'slug')),
+        60,
+        cache=sidebar_cache)
+    return {'cats': [{'cat_title': cat_title, 'slug': slug} for cat_title, slug in rows]}
 
 
 @register.simple_tag
 def total_posts():
-    return Post.published.count()
+    return cache_services.get_or_compute('published_posts_count:' + cache_services.get_sidebar_stamp('posts'),
+                                         Post.published.count,
+                                         60,
+                                         cache=sidebar_cache)
 
 
 @register.simple_tag
 def get_most_commented_posts(count=3):
-    most_commented_posts = cache.get('most_commented_posts')
-    if not most_commented_posts:
-        most_commented_posts = Post.published.annotate(total_comments=Count('comments'))\
-                         .order_by('-total_comments')[:count]
-        cache.set('most_commented_posts', most_commented_posts, 60)
-    return most_commented_posts
+    def most_commented_posts():
+        posts = Post.published.order_by('-comment_count').only('title', 'slug', 'publish')[:count]
+        return [(post.title, post.get_absolute_url()) for post in posts]
+
+    rows = cache_services.get_or_compute(
+        f'most_commented:{count}:' + cache_services.get_sidebar_stamp('top-posts'),
+        most_commented_posts,
+        60,
+        cache=sidebar_cache)
+    return [{'title': title, 'url': url} for title, url in rows]
+
+
+@register.simple_tag
+def sidebar_stamp(*names):
+    """Штамп версий данных сайдбара для ключа кеша фрагмента шаблона ({% cache %})"""
+
+    return cache_services.get_sidebar_stamp(*names)
 
 
 @register.simple_tag
 def get_total_views(pk):
-    total_views = int(r.get(f'post:{pk}:views')) if r.get(f'post:{pk}:views') else 0
-    return total_views
+    return redis_services.get_views(pk)
+
+
+@register.simple_tag
+def get_unique_views(pk):
+    return redis_services.get_unique_views(pk)
 
 
 @register.simple_tag
@@ -48,8 +74,20 @@ def get_category_name(pk):
 
 @register.inclusion_tag('post/post/includes/tags_list.html')
 def show_all_tags():
-    tag_lst = cache.get('tag_lst')
-    if not tag_lst:
-        tag_lst = Tag.objects.all().only('slug', 'name')
-        cache.set('tag_lst', tag_lst, 60)
-    return {'tags': tag_lst}
+    rows = cache_services.get_or_compute('tags:' + cache_services.get_sidebar_stamp('tags'),
+                                         lambda: list(Tag.objects.values_list('slug', 'name')),
+                                         60,
+                                         cache=sidebar_cache)
+    return {'tags': [{'slug': slug, 'name': name} for slug, name in rows]}
+
+
+@register.filter
+def image_url(fieldfile, alias):
+    """
+    URL миниатюры изображения по алиасу THUMBNAIL_ALIASES.
+    Пока загруженное изображение не обработано (process_uploaded_image), возвращает заглушку
+    """
+
+    if fieldfile and not image_services.is_processed(fieldfile):
+        return static(settings.IMAGE_PLACEHOLDERS[alias])
+    return thumbnail_url(fieldfile, alias)
@@ -1,6 +1,8 @@
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
 from django.test import TestCase
 
 from post.models import Post, Category, Comment, Tag
@@ -70,6 +72,31 @@ class PostModelTest(TestCase):
         expected_object_name = post.title
         self.assertEqual(expected_object_name, str(post))
 
+    def test_search_vector_is_filled_on_save(self):
+        post = Post.objects.last()
+        self.assertIsNotNone(post.search_vector)
+
+    def test_search_vector_is_updated_on_bulk_update(self):
+        Post.objects.update(title='Обновленный заголовок')
+        search_query = SearchQuery('обновленный', config=settings.SEARCH_CONFIG)
+        self.assertTrue(Post.objects.filter(search_vector=search_query).exists())
+
+    def test_excerpt_is_filled_on_save(self):
+        post = Post.objects.last()
+        post.body = '<p>Текст &laquo;поста&raquo;</p><p>' + ' слово' * 100 + '</p>'
+        post.save()
+        post.refresh_from_db()
+        self.assertTrue(post.excerpt.startswith('Текст «поста» слово'))
+        self.assertNotIn('<p>', post.excerpt)
+        self.assertEqual(len(post.excerpt.split()), 50)
+
+    def test_excerpt_is_updated_with_update_fields(self):
+        post = Post.objects.last()
+        post.body = 'Новый текст'
+        post.save(update_fields=['body'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Новый текст')
+
     def test_get_absolute_url(self):
         post = Post.objects.last()
         today = datetime.now()
@@ -0,0 +1,183 @@
+import time
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from post.models import Post, Tag
+from post.templatetags import tag_example
+from services import services, cache_services, redis_services
+from services.cache_backends import LocalTier
+
+
+class PostListProjectionTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test_user', password='12345')
+        Post.objects.create(title='Post title',
+                            slug='post_title',
+                            body='Post text',
+                            author=self.user)
+
+    def test_heavy_fields_are_deferred(self):
+        post = services.all_objects(Post.published, **services.POST_LIST_PROJECTION).get()
+        self.assertTrue(set(services.POST_HEAVY_FIELDS) <= post.get_deferred_fields())
+
+    def test_list_fields_are_loaded_in_one_query(self):
+        with self.assertNumQueries(1):
+            post = services.all_objects(Post.published, **services.POST_LIST_PROJECTION).get()
+            self.assertEqual((post.excerpt, post.comment_count, post.author.username),
+                             ('Post text', 0, 'test_user'))
+
+
+class CachedObjectsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test_user', password='12345')
+        self.post = Post.objects.create(title='Post title',
+                                        slug='post_title',
+                                        body='Post text',
+                                        author=self.user)
+        self.tag = Tag.objects.create(name='Tag', slug='tag')
+
+    def test_cached_query_fetches_objects_by_pk(self):
+        self.post.tags.add(self.tag)
+        list(services.filter_objects(Post.published, tags__slug='tag', cache=60))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(services.filter_objects(Post.published, tags__slug='tag', cache=60)),
+                             [self.post])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('post_post_tags', queries[0]['sql'])
+
+    def test_cache_invalidated_on_save(self):
+        list(services.all_objects(Tag.objects, cache=60))
+        tag = Tag.objects.create(name='New tag', slug='new_tag')
+        self.assertIn(tag, services.all_objects(Tag.objects, cache=60))
+
+    def test_cache_invalidated_on_delete(self):
+        list(services.all_objects(Tag.objects, cache=60))
+        self.tag.delete()
+        self.assertEqual(list(services.all_objects(Tag.objects, cache=60)), [])
+
+    def test_cache_invalidated_on_m2m_change(self):
+        self.assertEqual(list(services.filter_objects(Post.published, tags__slug='tag', cache=60)), [])
+        self.post.tags.add(self.tag)
+        self.assertEqual(list(services.filter_objects(Post.published, tags__slug='tag', cache=60)),
+                         [self.post])
+
+    def test_invalidation_repeated_after_commit(self):
+        bump_generation = mock.Mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_services.invalidate(bump_generation, Tag)
+            bump_generation.assert_called_once_with(Tag)
+        self.assertEqual(bump_generation.call_args_list, [mock.call(Tag), mock.call(Tag)])
+
+    def test_login_does_not_bump_user_generation(self):
+        with mock.patch('services.cache_services.bump_generation') as bump_generation:
+            self.client.login(username='test_user', password='12345')
+        bump_generation.assert_not_called()
+
+    def test_author_rename_bumps_user_generation(self):
+        with mock.patch('services.cache_services.bump_generation') as bump_generation:
+            self.user.username = 'renamed_user'
+            self.user.save()
+        bump_generation.assert_called_with(get_user_model())
+
+
+class LocalTierTest(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        tier = LocalTier(max_entries=2, timeout=60)
+        tier.set('a', 1)
+        tier.set('b', 2)
+        tier.get('a')
+        tier.set('c', 3)
+        self.assertEqual(tier.get('a'), (True, 1))
+        self.assertEqual(tier.get('b'), (False, None))
+
+    def test_entry_expires(self):
+        tier = LocalTier(max_entries=2, timeout=0.01)
+        tier.set('a', 1)
+        time.sleep(0.02)
+        self.assertEqual(tier.get('a'), (False, None))
+
+
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        self.cache = caches['sidebar']
+
+    def test_value_is_served_from_process_memory(self):
+        self.cache.set('two_tier_test', [1, 2])
+        # значение удалено из Redis в обход локального уровня
+        self.cache._cache.delete(self.cache.make_key('two_tier_test'))
+        self.assertEqual(self.cache.get('two_tier_test'), [1, 2])
+
+    def test_delete_removes_both_tiers(self):
+        self.cache.set('two_tier_test', [1, 2])
+        self.cache.delete('two_tier_test')
+        self.assertIsNone(self.cache.get('two_tier_test'))
+
+
+class GetOrComputeTest(TestCase):
+    def setUp(self):
+        self.key = f'get_or_compute_test:{uuid.uuid4()}'
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(cache_services.get_or_compute(self.key, self.compute, 60), 1)
+        self.assertEqual(cache_services.get_or_compute(self.key, self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_value_is_recomputed(self):
+        cache.set(self.key, ('old', 0.1, time.time() - 1), 60)
+        self.assertEqual(cache_services.get_or_compute(self.key, self.compute, 60), 1)
+
+    def test_stale_value_is_served_while_recomputing(self):
+        cache.set(self.key, ('old', 0.1, time.time() - 1), 60)
+        redis_services.acquire_lock(cache.make_key(self.key), 10)
+        self.assertEqual(cache_services.get_or_compute(self.key, self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_lock_of_other_process_is_kept(self):
+        lock_key = cache.make_key(self.key)
+
+        def compute():
+            # блокировка истекла во время пересчета и захвачена другим процессом
+            redis_services.r.delete(redis_services.CACHE_LOCK_KEY.format(key=lock_key))
+            redis_services.acquire_lock(lock_key, 10)
+            return 'new'
+
+        self.assertEqual(cache_services.get_or_compute(self.key, compute, 60), 'new')
+        self.assertIsNone(redis_services.acquire_lock(lock_key, 10))
+
+
+class SidebarTagsTest(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='test_user', password='12345')
+        for i in range(3):
+            Post.objects.create(title=f'Post title {i}',
+                                slug=f'post_title_{i}',
+                                body='Post text',
+                                author=user)
+        Tag.objects.create(name='Tag', slug='tag')
+
+    def test_tags_are_cached_as_rows_and_invalidated(self):
+        self.assertEqual(tag_example.show_all_tags()['tags'], [{'slug': 'tag', 'name': 'Tag'}])
+        Tag.objects.create(name='New tag', slug='new_tag')
+        self.assertEqual(len(tag_example.show_all_tags()['tags']), 2)
+
+    def test_most_commented_posts_respect_count(self):
+        self.assertEqual(len(tag_example.get_most_commented_posts(3)), 3)
+        post = tag_example.get_most_commented_posts(1)[0]
+        self.assertEqual(set(post), {'title', 'url'})
+
+    def test_sidebar_fragment_is_refreshed_on_tag_change(self):
+        self.client.get(reverse('index'))
+        Tag.objects.create(name='Fresh', slug='fresh')
+        self.assertContains(self.client.get(reverse('index')), '#Fresh')
@@ -0,0 +1,236 @@
+import io
+import shutil
+import tempfile
+import time
+import uuid
+from smtplib import SMTPException
+from unittest import mock
+
+from celery.exceptions import Retry
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from easy_thumbnails.alias import aliases
+from PIL import Image
+
+from post.models import Post
+from post.tasks import sync_post_views, fan_out_post, rebuild_timeline, send_mail_chunk, \
+    send_digest_batch, process_uploaded_image
+from services import services, redis_services
+
+
+class SyncPostViewsTaskTest(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(title='Post title',
+                                        slug='post_title',
+                                        body='Post text',
+                                        author=get_user_model().objects.create_user(username='test_user',
+                                                                                    password='12345'))
+        # Перенос просмотров, накопленных до начала теста
+        sync_post_views()
+
+    def test_pending_views_are_persisted(self):
+        redis_services.incr_views(self.post.pk)
+        redis_services.incr_views(self.post.pk)
+        sync_post_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 2)
+
+    def test_pending_views_are_cleared_after_sync(self):
+        redis_services.incr_views(self.post.pk)
+        sync_post_views()
+        sync_post_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+
+    @override_settings(VIEWS_BUFFER_ENABLED=True, VIEWS_BUFFER_MAX_SIZE=2)
+    def test_buffered_views_are_flushed_by_size(self):
+        redis_services.flush_views()
+        views = redis_services.get_views(self.post.pk)
+        redis_services.incr_views(self.post.pk)
+        self.assertEqual(redis_services.get_views(self.post.pk), views)
+        redis_services.incr_views(self.post.pk)
+        self.assertEqual(redis_services.get_views(self.post.pk), views + 2)
+
+    @override_settings(VIEWS_BUFFER_ENABLED=True, VIEWS_BUFFER_MAX_SIZE=100, VIEWS_BUFFER_FLUSH_INTERVAL=0.1)
+    def test_buffered_views_are_flushed_by_timer(self):
+        redis_services.flush_views()
+        views = redis_services.get_views(self.post.pk)
+        redis_services.incr_views(self.post.pk)
+        time.sleep(0.5)
+        self.assertEqual(redis_services.get_views(self.post.pk), views + 1)
+
+    def test_restore_views_keeps_larger_count(self):
+        redis_services.set_views_many({self.post.pk: 10})
+        call_command('restore_views', stdout=io.StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 10)
+        self.assertEqual(redis_services.get_views(self.post.pk), 10)
+
+        Post.objects.filter(pk=self.post.pk).update(view_count=15)
+        call_command('restore_views', stdout=io.StringIO())
+        self.assertEqual(redis_services.get_views(self.post.pk), 15)
+
+
+class TimelineTaskTest(TestCase):
+    def setUp(self):
+        self.author = get_user_model().objects.create_user(username='author', password='12345')
+        self.follower = get_user_model().objects.create_user(username='follower', password='12345')
+        self.follower.following.add(self.author)
+        redis_services.drop_timeline(self.follower.pk)
+        redis_services.set_celebrity(self.author.pk, False)
+
+    def create_post(self, num):
+        return Post.objects.create(title=f'Post title {num}',
+                                   slug=f'post_title_{num}',
+                                   body='Post text',
+                                   author=self.author)
+
+    def test_rebuild_timeline(self):
+        post1 = self.create_post(1)
+        post2 = self.create_post(2)
+        rebuild_timeline(self.follower.pk)
+        self.assertEqual(redis_services.get_timeline(self.follower.pk), [post2.pk, post1.pk])
+
+    def test_fan_out_post_to_built_timeline(self):
+        rebuild_timeline(self.follower.pk)
+        post = self.create_post(1)
+        fan_out_post(post.pk)
+        self.assertEqual(redis_services.get_timeline(self.follower.pk), [post.pk])
+
+    def test_fan_out_post_skips_cold_timeline(self):
+        fan_out_post(self.create_post(1).pk)
+        self.assertIsNone(redis_services.get_timeline(self.follower.pk))
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=0)
+    def test_celebrity_posts_are_merged_on_read(self):
+        rebuild_timeline(self.follower.pk)
+        post = self.create_post(1)
+        fan_out_post(post.pk)
+        self.assertEqual(redis_services.get_timeline(self.follower.pk), [])
+        self.assertIn(self.author.pk, redis_services.get_celebrities())
+        self.assertEqual(list(services.following_posts(Post.published, user=self.follower)), [post])
+
+    def test_cold_timeline_rebuild_is_queued_once(self):
+        with mock.patch('services.services.rebuild_timeline') as task:
+            list(services.following_posts(Post.published, user=self.follower))
+            list(services.following_posts(Post.published, user=self.follower))
+        task.delay.assert_called_once_with(self.follower.pk)
+
+    def test_publishing_draft_schedules_fan_out(self):
+        post = Post.objects.create(title='Draft', slug='draft', body='Post text',
+                                   author=self.author, status=Post.Status.DRAFT)
+        with mock.patch('post.signals.fan_out_post') as task, self.captureOnCommitCallbacks(execute=True):
+            post.status = Post.Status.PUBLISHED
+            post.save()
+        task.delay.assert_called_once_with(post.pk)
+
+        with mock.patch('post.signals.fan_out_post') as task, self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Updated'
+            post.save()
+        task.delay.assert_not_called()
+
+
+class SendMailChunkTaskTest(TestCase):
+    def test_one_message_per_recipient(self):
+        sent = send_mail_chunk('Новый пост', 'Текст', ['user1@example.com', 'user2@example.com'])
+        self.assertEqual(sent, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].to, ['user2@example.com'])
+
+    def test_retry_skips_delivered_recipients(self):
+        def send_messages(backend, messages):
+            if messages[0].to == ['user2@example.com']:
+                raise SMTPException('Temporary failure')
+            return 1
+
+        recipients = ['user1@example.com', 'user2@example.com', 'user3@example.com']
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        autospec=True, side_effect=send_messages), \
+                mock.patch.object(send_mail_chunk, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                send_mail_chunk('Новый пост', 'Текст', recipients)
+        self.assertEqual(retry.call_args.kwargs['args'],
+                         ('Новый пост', 'Текст', ['user2@example.com', 'user3@example.com']))
+
+
+class SendDigestBatchTaskTest(TestCase):
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(username=f'user{i}',
+                                                           email=f'user{i}@example.com',
+                                                           password='12345')
+                      for i in range(3)]
+        self.run_id = f'test-{uuid.uuid4()}'
+
+    def test_batch_is_sent_once(self):
+        start, end = self.users[0].pk, self.users[-1].pk + 1
+        send_digest_batch(self.run_id, start, end, 'Текст')
+        self.assertEqual(len(mail.outbox), 3)
+
+        # повторный запуск той же рассылки не отправляет пачку снова
+        send_digest_batch(self.run_id, start, end, 'Текст')
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(redis_services.get_done_digest_batches(self.run_id), {start})
+
+    def test_redelivered_batch_skips_sent_recipients(self):
+        start, end = self.users[0].pk, self.users[-1].pk + 1
+        redis_services.claim_digest_batch(self.run_id, start, 'task-id')
+        redis_services.add_sent_digest_email(self.run_id, start, 'user0@example.com')
+        # повторная доставка брокером той же задачи
+        send_digest_batch.apply((self.run_id, start, end, 'Текст'), task_id='task-id')
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['user1@example.com'], ['user2@example.com']])
+        self.assertEqual(redis_services.get_done_digest_batches(self.run_id), {start})
+
+    def test_batch_claimed_by_other_task_is_skipped(self):
+        start, end = self.users[0].pk, self.users[-1].pk + 1
+        redis_services.claim_digest_batch(self.run_id, start, 'other-task-id')
+        send_digest_batch(self.run_id, start, end, 'Текст')
+        self.assertEqual(mail.outbox, [])
+
+    def test_batch_sends_only_its_pk_range(self):
+        send_digest_batch(self.run_id, self.users[1].pk, self.users[1].pk + 1, 'Текст')
+        self.assertEqual([message.to for message in mail.outbox], [['user1@example.com']])
+
+
+class ProcessUploadedImageTaskTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        content = io.BytesIO()
+        Image.new('RGB', (3200, 1712), 'white').save(content, 'PNG')
+        self.post = Post.objects.create(title='Post with image',
+                                        slug='post_with_image',
+                                        body='Post text',
+                                        author=get_user_model().objects.create_user(username='user',
+                                                                                    password='12345'),
+                                        title_image=SimpleUploadedFile('image.png', content.getvalue(),
+                                                                       content_type='image/png'))
+
+    def test_upload_is_stored_unprocessed(self):
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.title_image_processed)
+        self.assertEqual(self.post.title_image.width, 3200)
+
+    def test_image_is_resized(self):
+        process_uploaded_image('post.Post', self.post.pk, 'title_image', self.post.title_image.name)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.title_image_processed)
+        self.assertLessEqual(self.post.title_image.width, 1600)
+
+    def test_thumbnails_are_generated_for_all_aliases(self):
+        process_uploaded_image('post.Post', self.post.pk, 'title_image', self.post.title_image.name)
+        self.post.refresh_from_db()
+        for options in aliases.all(self.post.title_image).values():
+            self.assertIsNotNone(self.post.title_image.get_existing_thumbnail(options))
+
+    def test_replaced_image_is_not_processed(self):
+        process_uploaded_image('post.Post', self.post.pk, 'title_image', 'post/old.png')
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.title_image_processed)
@@ -1,14 +1,18 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from account.models import User
 from post.models import Post, Category, Tag, Comment
+from services import services, redis_services, search_services
 
 from http import HTTPStatus
+import uuid
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PostListViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -44,13 +48,53 @@ class PostListViewTest(TestCase):
         self.assertTrue(response.context['title'] == 'Главная страница')
 
     def test_pagination_next_page(self):
-        response = self.client.get(reverse('index')+'?page=2')
+        response = self.client.get(reverse('index'))
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('index')+f'?cursor={next_cursor}')
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTrue('is_paginated' in response.context)
         self.assertTrue(response.context['is_paginated'] is True)
         self.assertTrue(len(response.context['posts']) == 2)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_pagination_previous_page(self):
+        first_page = self.client.get(reverse('index'))
+        next_cursor = first_page.context['page_obj'].next_cursor
+        second_page = self.client.get(reverse('index')+f'?cursor={next_cursor}')
+        previous_cursor = second_page.context['page_obj'].previous_cursor
+        response = self.client.get(reverse('index')+f'?cursor={previous_cursor}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(list(response.context['posts']), list(first_page.context['posts']))
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_pagination_posts_are_not_repeated(self):
+        first_page = self.client.get(reverse('index'))
+        next_cursor = first_page.context['page_obj'].next_cursor
+        second_page = self.client.get(reverse('index')+f'?cursor={next_cursor}')
+        posts = list(first_page.context['posts']) + list(second_page.context['posts'])
+        self.assertEqual(posts, list(Post.published.order_by('-publish', '-id')))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('index')+'?cursor=invalid')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_posts_have_comment_count(self):
+        post = Post.objects.first()
+        Comment.objects.create(author=post.author, post=post, body='Comment to post')
+        services.refresh_comment_counters()
+        response = self.client.get(reverse('index'))
+        for post in response.context['posts']:
+            self.assertEqual(post.comment_count, post.comments.count())
+
+    def test_posts_have_total_views(self):
+        response = self.client.get(reverse('index'))
+        for post in response.context['posts']:
+            self.assertEqual(post.total_views, redis_services.get_views(post.pk))
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class CategoryListViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -90,13 +134,16 @@ class CategoryListViewTest(TestCase):
         self.assertTrue(response.context['title'] == f'По категории: Category')
 
     def test_pagination_next_page(self):
-        response = self.client.get(reverse('category_list', args=('category',))+'?page=2')
+        response = self.client.get(reverse('category_list', args=('category',)))
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('category_list', args=('category',))+f'?cursor={next_cursor}')
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTrue('is_paginated' in response.context)
         self.assertTrue(response.context['is_paginated'] is True)
         self.assertTrue(len(response.context['posts']) == 2)
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PostDetailViewTest(TestCase):
     def setUp(self):
         category = Category.objects.create(cat_title='Category',
@@ -126,6 +173,13 @@ class PostDetailViewTest(TestCase):
         response = self.client.get(self.post.get_absolute_url())
         self.assertTemplateUsed(response, 'post/post/detail.html')
 
+    def test_unique_views_count_each_visitor_once(self):
+        unique_views = redis_services.get_unique_views(self.post.pk)
+        user_agent = f'test-agent-{uuid.uuid4()}'
+        self.client.get(self.post.get_absolute_url(), HTTP_USER_AGENT=user_agent)
+        self.client.get(self.post.get_absolute_url(), HTTP_USER_AGENT=user_agent)
+        self.assertEqual(redis_services.get_unique_views(self.post.pk), unique_views + 1)
+
     def test_title(self):
         response = self.client.get(self.post.get_absolute_url())
         self.assertTrue('title' in response.context)
@@ -135,6 +189,21 @@ class PostDetailViewTest(TestCase):
         response = self.client.get(self.post.get_absolute_url())
         self.assertEqual(self.post.body, response.context_data['post'].body)
 
+    def test_not_modified(self):
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertIn('Last-Modified', response)
+        views = redis_services.get_views(self.post.pk)
+        response = self.client.get(self.post.get_absolute_url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(redis_services.get_views(self.post.pk), views + 1)
+
+    def test_modified_after_post_update(self):
+        etag = self.client.get(self.post.get_absolute_url())['ETag']
+        self.post.body = 'Updated post text'
+        self.post.save()
+        response = self.client.get(self.post.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
 
 class AboutViewTest(TestCase):
     def test_view_url_exists_at_desired_location(self):
@@ -174,6 +243,7 @@ class ContactViewTest(TestCase):
         self.assertTrue(response.context['title'] == 'Контакты')
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class TagListViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -213,19 +283,85 @@ class TagListViewTest(TestCase):
         self.assertTrue(response.context['title'] == 'По тегу: Tag 1')
 
     def test_lists_all_posts(self):
-        response = self.client.get(reverse('post_list_tag', args=('tag_1',))+'?page=2')
+        response = self.client.get(reverse('post_list_tag', args=('tag_1',)))
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('post_list_tag', args=('tag_1',))+f'?cursor={next_cursor}')
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTrue('is_paginated' in response.context)
         self.assertTrue(response.context['is_paginated'] is True)
         self.assertTrue(len(response.context['posts']) == 2)
 
 
+class PostSearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='test_user')
+        Post.objects.create(title='Питон для начинающих',
+                            slug='piton',
+                            body='Текст о программировании',
+                            author=user)
+        Post.objects.create(title='Рецепты',
+                            slug='recepty',
+                            body='Текст о кулинарии',
+                            author=user)
+
+    def test_view_uses_correct_template(self):
+        response = self.client.get(reverse('post_search'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, 'post/post/search.html')
+
+    def test_search_uses_russian_stemming(self):
+        response = self.client.get(reverse('post_search'), {'query': 'питона'})
+        self.assertEqual([post.slug for post in response.context['results']], ['piton'])
+
+    def test_search_by_body(self):
+        response = self.client.get(reverse('post_search'), {'query': 'кулинария'})
+        self.assertEqual([post.slug for post in response.context['results']], ['recepty'])
+
+    def test_search_results_have_headline(self):
+        response = self.client.get(reverse('post_search'), {'query': 'кулинария'})
+        self.assertIn('<mark>кулинарии</mark>', response.context['results'][0].headline)
+
+    def test_search_post_ids_are_cached(self):
+        search_services.search_post_ids('питон')
+        with self.assertNumQueries(0):
+            post_ids, fuzzy = search_services.search_post_ids('  Питон ')
+            self.assertEqual(len(post_ids), 1)
+
+    def test_search_cache_invalidated_on_post_change(self):
+        search_services.search_post_ids('питон')
+        post = Post.objects.get(slug='recepty')
+        post.title = 'Питон на ужин'
+        post.save()
+        post_ids, fuzzy = search_services.search_post_ids('питон')
+        self.assertEqual(len(post_ids), 2)
+
+    def test_search_falls_back_to_similar_titles(self):
+        response = self.client.get(reverse('post_search'), {'query': 'рецепы'})
+        self.assertTrue(response.context['fuzzy'])
+        self.assertEqual([post.slug for post in response.context['results']], ['recepty'])
+
+    def test_search_results_ranked_and_paginated(self):
+        user = User.objects.get(username='test_user')
+        for i in range(settings.SEARCH_RESULTS_PER_PAGE):
+            Post.objects.create(title=f'Текст {i}', slug=f'tekst-{i}', body='Текст', author=user)
+        response = self.client.get(reverse('post_search'), {'query': 'текст'})
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         settings.SEARCH_RESULTS_PER_PAGE + 2)
+        self.assertEqual(len(response.context['results']), settings.SEARCH_RESULTS_PER_PAGE)
+        # совпадение в заголовке весомее совпадения только в тексте
+        self.assertTrue(response.context['results'][0].slug.startswith('tekst-'))
+        response = self.client.get(reverse('post_search'), {'query': 'текст', 'page': 2})
+        self.assertEqual(len(response.context['results']), 2)
+
+
 class PostListByFollowingViewTest(TestCase):
     def setUp(self):
         user1 = get_user_model().objects.create_user(username='test_user1', password='12345')
         user1.save()
         user2 = get_user_model().objects.create_user(username='test_user2', password='12345')
         user2.save()
+        redis_services.drop_timeline(user1.pk)
 
         for post_num in range(5):
             post = Post.objects.create(title='Title %s' % post_num,
@@ -283,10 +419,19 @@ class PostListByFollowingViewTest(TestCase):
         self.assertTrue(resp.context['is_paginated'] is True)
 
         # проверка количества постов на второй странице
-        response = self.client.get(reverse('following_list') + '?page=2')
+        next_cursor = resp.context['page_obj'].next_cursor
+        response = self.client.get(reverse('following_list') + f'?cursor={next_cursor}')
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTrue(len(response.context['posts']) == 2)
 
+    def test_empty_built_timeline(self):
+        user1 = get_user_model().objects.get(username='test_user1')
+        redis_services.set_timeline(user1.pk, {})
+        self.client.login(username='test_user1', password='12345')
+        resp = self.client.get(reverse('following_list'))
+        self.assertEqual(resp.status_code, HTTPStatus.OK)
+        self.assertEqual(len(resp.context['posts']), 0)
+
     def test_title(self):
         login = self.client.login(username='test_user1', password='12345')
         response = self.client.get(reverse('following_list'))
@@ -500,6 +645,7 @@ class PostDeleteViewTest(TestCase):
         self.assertRedirects(resp, reverse('index'))
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PostCommentViewTest(TestCase):
     def setUp(self):
         user1 = get_user_model().objects.create_user(username='test_user1', password='12345')
@@ -530,6 +676,15 @@ class PostCommentViewTest(TestCase):
         resp = self.client.get(reverse('post_comment', args=(self.post.pk,)))
         self.assertEqual(resp.status_code, HTTPStatus.FORBIDDEN)
 
+    def test_comment_updates_post_counters(self):
+        login = self.client.login(username='test_user2', password='12345')
+        resp = self.client.post(reverse('post_comment', args=(self.post.pk,)), {'body': 'New comment'})
+        self.assertRedirects(resp, self.post.get_absolute_url())
+        self.post.refresh_from_db()
+        comment = Comment.objects.get(post=self.post)
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_at, comment.created)
+
     # def test_logged_in_with_permission_create_comment(self):
     #     login = self.client.login(username='test_user2', password='12345')
     #     resp = self.client.get(reverse('post_comment', args=(self.post.pk,)))
@@ -556,6 +711,7 @@ class PostCommentViewTest(TestCase):
     #     self.assertTrue(resp, reverse('index'))
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class CommentUpdateViewTest(TestCase):
     def setUp(self):
         user1 = get_user_model().objects.create_user(username='test_user1', password='12345')
@@ -635,6 +791,7 @@ class CommentUpdateViewTest(TestCase):
         self.assertRedirects(resp, self.comment.post.get_absolute_url())
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class CommentDeleteView(TestCase):
     def setUp(self):
         user1 = get_user_model().objects.create_user(username='test_user1', password='12345')
@@ -710,3 +867,59 @@ class CommentDeleteView(TestCase):
         login = self.client.login(username='test_user3', password='12345')
         resp = self.client.post(reverse('delete_comment', args=(self.comment.pk,)), follow=True)
         self.assertRedirects(resp, self.comment.post.get_absolute_url())
+
+    def test_delete_updates_post_counters(self):
+        services.refresh_comment_counters({self.comment.post_id})
+        login = self.client.login(username='test_user3', password='12345')
+        self.client.post(reverse('delete_comment', args=(self.comment.pk,)))
+        post = Post.objects.get(pk=self.comment.post_id)
+        self.assertEqual(post.comment_count, 0)
+        self.assertIsNone(post.last_commented_at)
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='page_cache_user')
+        cls.post = Post.objects.create(title='Cached post',
+                                       slug='cached_post',
+                                       body='Cached post text',
+                                       author=cls.user,
+                                       status='PB')
+
+    def test_anonymous_page_is_cached(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Cached post')
+
+    def test_page_is_purged_on_post_change(self):
+        self.client.get(reverse('index'))
+        self.post.title = 'Renamed post'
+        self.post.save()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed post')
+
+    def test_list_page_is_purged_on_comment_change(self):
+        self.client.get(reverse('index'))
+        Comment.objects.create(post=self.post, author=self.user, body='New comment')
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+
+    def test_detail_page_is_purged_on_other_post_comment(self):
+        other_post = Post.objects.create(title='Other post',
+                                         slug='other_post',
+                                         body='Other post text',
+                                         author=self.user,
+                                         status='PB')
+        self.client.get(self.post.get_absolute_url())
+        Comment.objects.create(post=other_post, author=self.user, body='New comment')
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+
+    def test_authenticated_page_is_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
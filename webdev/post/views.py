@@ -1,11 +1,12 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.contrib.postgres.search import SearchVector
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.views import generic
 # from django.core.cache import cache (cache.get(), cache.set(key, queryset, time))
 
-from services import services, redis_services
+from services import services, cache_services, redis_services, search_services
 from .models import *
 from .mixins import *
 from .forms import *
@@ -27,24 +28,28 @@ def access_is_denied(request, exception):
     return render(request, 'post/post/403.html', status=403)
 
 
-class PostListView(generic.ListView):
+class PostListView(PageCacheMixin,
+                   PostListVersionMixin,
+                   KeysetPaginationMixin,
+                   PostViewsMixin,
+                   generic.ListView):
     """
     Вывод списка постов на главной странице
     """
 
     queryset = services.all_objects(Post.published,
-                                    select_related=('cat', 'author'),
-                                    prefetch_related=('comments', ),
-                                    only=('title', 'slug', 'body', 'title_image',
-                                          'publish', 'author__username', 'author__id',
-                                          'cat__cat_title', 'cat__slug'))
+                                    **services.POST_LIST_PROJECTION)
     template_name = 'post/post/list.html'
     context_object_name = 'posts'
     paginate_by = 3
     extra_context = {'title': 'Главная страница'}
 
 
-class CategoryListView(generic.ListView):
+class CategoryListView(PageCacheMixin,
+                       PostListVersionMixin,
+                       KeysetPaginationMixin,
+                       PostViewsMixin,
+                       generic.ListView):
     """
     Вывод списка постов выбранной категории
     """
@@ -62,14 +67,12 @@ class CategoryListView(generic.ListView):
     def get_queryset(self):
         return services.filter_objects(Post.published,
                                        cat__slug=self.kwargs.get('slug'),
-                                       select_related=('cat', 'author'),
-                                       prefetch_related=('comments',),
-                                       only=('title', 'slug', 'body', 'title_image',
-                                             'publish', 'author__username', 'author__id',
-                                             'cat__cat_title', 'cat__slug'))
+                                       **services.POST_LIST_PROJECTION)
 
 
-class PostDetailView(generic.DetailView):
+class PostDetailView(PageCacheMixin,
+                     ConditionalGetMixin,
+                     generic.DetailView):
     """
     Детальный вывод одного поста
     """
@@ -83,7 +86,7 @@ class PostDetailView(generic.DetailView):
         context['comments'] = services.all_objects(kwargs['object'].comments,
                                                    select_related=('author',))
         context['form'] = CommentForm()
-        redis_services.incr_views(context['post'].id)
+        redis_services.incr_views(context['post'].id, services.get_visitor_id(self.request))
         context['title'] = self.object.title
         return context
 
@@ -91,6 +94,25 @@ class PostDetailView(generic.DetailView):
         return services.get_instance_by_unique_field(Post.published,
                                                      slug=self.kwargs.get(self.slug_url_kwarg))
 
+    def get_version(self):
+        self.validators = services.get_post_validators(Post.published,
+                                                       slug=self.kwargs.get(self.slug_url_kwarg))
+        if self.validators is None:
+            return None
+        return (*self.validators['version'],
+                cache_services.get_sidebar_stamp('categories', 'tags', 'top-posts', 'posts'))
+
+    def get_last_modified(self):
+        return self.validators['last_modified'] if self.validators else None
+
+    def not_modified(self) -> None:
+        redis_services.incr_views(self.validators['pk'], services.get_visitor_id(self.request))
+
+    def get_page_cache_tags(self) -> set:
+        # просмотр страницы, отданной из кеша, учитывает AnonymousPageCacheMiddleware
+        self.request.page_cache_post_id = self.object.pk
+        return {f'post:{self.object.pk}'}
+
 
 class PostCreateView(PermissionRequiredMixin,
                      generic.CreateView):
@@ -228,6 +250,11 @@ class CommentDeleteView(IsCommentOwnerOrAdminMixin,
         post = comment.post
         return post.get_absolute_url()
 
+    def form_valid(self, form):
+        success_url = self.get_success_url()
+        services.delete_comment(self.object)
+        return redirect(success_url)
+
     def get_queryset(self):
         return services.filter_objects(Comment.objects,
                                        pk=self.kwargs.get('pk'),
@@ -259,7 +286,11 @@ class ContactsView(generic.TemplateView):
                      'text': text}
 
 
-class PostListByTagView(generic.ListView):
+class PostListByTagView(PageCacheMixin,
+                        PostListVersionMixin,
+                        KeysetPaginationMixin,
+                        PostViewsMixin,
+                        generic.ListView):
     """
     Вывод списка постов по выбранному тегу
     """
@@ -279,14 +310,13 @@ class PostListByTagView(generic.ListView):
     def get_queryset(self):
         return services.filter_objects(Post.published,
                                        tags__slug=self.kwargs.get('tag_slug'),
-                                       select_related=('cat', 'author'),
-                                       prefetch_related=('comments',),
-                                       only=('title', 'slug', 'body', 'title_image',
-                                             'publish', 'author__username', 'author__id',
-                                             'cat__cat_title', 'cat__slug'))
+                                       cache=settings.OBJECTS_CACHE_TIMEOUT,
+                                       **services.POST_LIST_PROJECTION)
 
 
 class PostListByFollowingView(LoginRequiredMixin,
+                              KeysetPaginationMixin,
+                              PostViewsMixin,
                               generic.ListView):
     """
     Вывод списка постов пользователей, на которых оформлена подписка
@@ -298,14 +328,9 @@ class PostListByFollowingView(LoginRequiredMixin,
     paginate_by = 3
 
     def get_queryset(self):
-        user_subscriptions = services.all_objects(self.request.user.following)
-        queryset = services.filter_objects(Post.published,
-                                           author__in=user_subscriptions,
-                                           select_related=('author', 'cat'),
-                                           prefetch_related=('comments',),
-                                           only=('title', 'slug', 'body', 'title_image',
-                                                 'publish', 'author__username', 'author__id',
-                                                 'cat__cat_title', 'cat__slug'))
+        queryset = services.following_posts(Post.published,
+                                            user=self.request.user,
+                                            **services.POST_LIST_PROJECTION)
         return queryset
 
     def get_object(self, queryset=None):
@@ -324,15 +349,23 @@ def post_search(request):
 
     form = SearchForm()
     query = None
+    page_obj = None
+    fuzzy = False
     results = []
 
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
             query = form.cleaned_data['query']
-            results = Post.published.annotate(search=SearchVector('title', 'body'), ).filter(search=query)
+            post_ids, fuzzy = search_services.search_post_ids(query)
+            paginator = Paginator(post_ids, settings.SEARCH_RESULTS_PER_PAGE)
+            page_obj = paginator.get_page(request.GET.get('page'))
+            results = search_services.get_search_results(query, page_obj.object_list)
 
     return render(request, 'post/post/search.html', {'form': form,
                                                      'query': query,
+                                                     'page_obj': page_obj,
+                                                     'fuzzy': fuzzy,
                                                      'results': results,
+                                                     'results_limit': settings.SEARCH_RESULTS_LIMIT,
                                                      'title': 'Поиск'})
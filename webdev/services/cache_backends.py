@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+
+class LocalTier:
+    """
+    Ограниченный LRU-кеш процесса с коротким временем жизни записей.
+    Записи удаляются по сообщениям канала Redis pub/sub от других процессов
+    """
+
+    def __init__(self, max_entries: int, timeout: int):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.sender = uuid.uuid4().hex
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.listener = None
+
+    def get(self, key):
+        """Возвращает пару (найдено, значение)"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, timeout=None):
+        if timeout is not None and timeout <= 0:
+            self.delete(key)
+            return
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache(RedisCache):
+    """
+    Кеш из двух уровней: LRU в памяти процесса перед Redis.
+    Чтение сначала обращается к памяти процесса и только при промахе к Redis.
+    Запись и удаление выполняются в Redis, а ключ публикуется в канал
+    pub/sub, по которому остальные процессы удаляют свою локальную копию.
+    Если сообщение потеряно, устаревшая копия живет не дольше LOCAL_TIMEOUT.
+
+    Значения из памяти процесса возвращаются без копирования и не должны изменяться.
+
+    Параметры OPTIONS: LOCAL_MAX_ENTRIES, LOCAL_TIMEOUT (сек.), CHANNEL
+    """
+
+    # локальные уровни процесса, общие для всех потоков: {(серверы, канал): LocalTier}
+    _tiers = {}
+    _tiers_lock = threading.Lock()
+
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        self._local_max_entries = options.pop('LOCAL_MAX_ENTRIES', 256)
+        self._local_timeout = options.pop('LOCAL_TIMEOUT', 5)
+        self._channel = options.pop('CHANNEL', 'cache:invalidate')
+        params['OPTIONS'] = options
+        super().__init__(server, params)
+
+    @property
+    def local(self) -> LocalTier:
+        """Локальный уровень текущего процесса, после fork создается заново"""
+
+        tier_key = (tuple(self._servers), self._channel)
+        tier = self._tiers.get(tier_key)
+        if tier is None or tier.pid != os.getpid():
+            with self._tiers_lock:
+                tier = self._tiers.get(tier_key)
+                if tier is None or tier.pid != os.getpid():
+                    tier = LocalTier(self._local_max_entries, self._local_timeout)
+                    self._tiers[tier_key] = tier
+                    self._start_listener(tier)
+        return tier
+
+    def _start_listener(self, tier: LocalTier) -> None:
+        tier.listener = threading.Thread(target=self._listen,
+                                         args=(tier,),
+                                         name=f'{self._channel}-listener',
+                                         daemon=True)
+        tier.listener.start()
+
+    def _listen(self, tier: LocalTier) -> None:
+        """Удаляет из локального уровня ключи, измененные другими процессами"""
+
+        while tier.pid == os.getpid():
+            try:
+                pubsub = self._cache.get_client(write=False).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # сообщения, пропущенные до подписки, могли касаться любых ключей
+                tier.clear()
+                for message in pubsub.listen():
+                    sender, _, key = message['data'].decode().partition(':')
+                    if sender == tier.sender:
+                        continue
+                    if key == '*':
+                        tier.clear()
+                    else:
+                        tier.delete(key)
+            except Exception:
+                tier.clear()
+                time.sleep(1)
+
+    def _publish(self, *keys) -> None:
+        client = self._cache.get_client(write=True)
+        for key in keys:
+            client.publish(self._channel, f'{self.local.sender}:{key}')
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        found, value = self.local.get(key)
+        if found:
+            return value
+        value = self._cache.get(key, self)
+        if value is self:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        missing = {}
+        for key in keys:
+            made_key = self.make_and_validate_key(key, version=version)
+            found, value = self.local.get(made_key)
+            if found:
+                result[key] = value
+            else:
+                missing[made_key] = key
+        if missing:
+            for made_key, value in self._cache.get_many(missing.keys()).items():
+                self.local.set(made_key, value)
+                result[missing[made_key]] = value
+        return result
+
+    def has_key(self, key, version=None):
+        found, _ = self.local.get(self.make_and_validate_key(key, version=version))
+        return found or super().has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version=version)
+        made_key = self.make_and_validate_key(key, version=version)
+        self.local.set(made_key, value, self.get_backend_timeout(timeout))
+        self._publish(made_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version=version)
+        if added:
+            made_key = self.make_and_validate_key(key, version=version)
+            self.local.set(made_key, value, self.get_backend_timeout(timeout))
+            self._publish(made_key)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        result = super().set_many(data, timeout, version=version)
+        made_keys = []
+        for key, value in data.items():
+            made_key = self.make_and_validate_key(key, version=version)
+            self.local.set(made_key, value, self.get_backend_timeout(timeout))
+            made_keys.append(made_key)
+        self._publish(*made_keys)
+        return result
+
+    def delete(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self.local.delete(made_key)
+        deleted = super().delete(key, version=version)
+        self._publish(made_key)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        made_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        for made_key in made_keys:
+            self.local.delete(made_key)
+        super().delete_many(keys, version=version)
+        self._publish(*made_keys)
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self.local.delete(made_key)
+        value = super().incr(key, delta, version=version)
+        self._publish(made_key)
+        return value
+
+    def clear(self):
+        self.local.clear()
+        result = super().clear()
+        self._publish('*')
+        return result
@@ -0,0 +1,252 @@
+import hashlib
+import math
+import random
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from services import redis_services
+
+# Поколение таблицы: увеличивается при любом изменении строк таблицы через ORM,
+# входит в ключи кешированных результатов запросов к этой таблице
+GENERATION_KEY = 'objects:generation:{table}'
+
+# Штамп версии данных сайдбаров, входит в ключи их кеша
+SIDEBAR_STAMP_KEY = 'stamp:{name}'
+
+# Версия корпуса постов: увеличивается при публикации, изменении и снятии
+# с публикации постов, входит в ключи кеша, зависящего от набора постов
+POSTS_CORPUS_VERSION_KEY = 'posts:corpus:version'
+
+# Версия выводимых вместе с постами полей авторов (services.POST_AUTHOR_FIELDS),
+# входит в версию списка постов API вместо поколения таблицы пользователей
+AUTHORS_VERSION_KEY = 'authors:version'
+
+
+def get_posts_corpus_version() -> int:
+    """Возвращает текущую версию корпуса постов"""
+
+    version = cache.get(POSTS_CORPUS_VERSION_KEY)
+    if version is None:
+        cache.add(POSTS_CORPUS_VERSION_KEY, 1, timeout=None)
+        version = cache.get(POSTS_CORPUS_VERSION_KEY, 1)
+    return version
+
+
+def bump_posts_corpus_version() -> None:
+    """
+    Увеличивает версию корпуса постов, делая недействительными
+    все записи кеша, построенные по предыдущей версии
+    """
+
+    try:
+        cache.incr(POSTS_CORPUS_VERSION_KEY)
+    except ValueError:
+        cache.add(POSTS_CORPUS_VERSION_KEY, 1, timeout=None)
+        cache.incr(POSTS_CORPUS_VERSION_KEY)
+
+
+def make_key(prefix: str, *parts) -> str:
+    """Формирует ключ кеша фиксированной длины из произвольных частей"""
+
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def get_counters(keys, cache=cache) -> dict:
+    """
+    Возвращает значения счетчиков версий. Отсутствующий счетчик инициализируется
+    текущим временем, чтобы после вытеснения ключа не совпасть со старыми ключами кеша
+    """
+
+    counters = cache.get_many(keys)
+    for key in set(keys) - counters.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        counters[key] = cache.get(key)
+    return counters
+
+
+def bump_counter(key: str, cache=cache) -> None:
+    """Увеличивает счетчик версии"""
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate(func: callable, *args) -> None:
+    """
+    Сбрасывает кеш вызовом func(*args). Внутри транзакции сброс повторяется после
+    ее фиксации: запрос, выполненный между первым сбросом и фиксацией, мог
+    закешировать еще не измененные данные под новой версией
+    """
+
+    func(*args)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(func, *args))
+
+
+def get_generations(tables) -> dict:
+    """Возвращает поколения таблиц"""
+
+    keys = {GENERATION_KEY.format(table=table): table for table in tables}
+    return {keys[key]: generation for key, generation in get_counters(list(keys)).items()}
+
+
+def bump_generation(model) -> None:
+    """Увеличивает поколение таблицы модели, делая недействительными кешированные запросы к ней"""
+
+    bump_counter(GENERATION_KEY.format(table=model._meta.db_table))
+
+
+def get_authors_version() -> int:
+    """Возвращает текущую версию полей авторов постов"""
+
+    return get_counters([AUTHORS_VERSION_KEY])[AUTHORS_VERSION_KEY]
+
+
+def bump_authors_version() -> None:
+    """Увеличивает версию полей авторов постов"""
+
+    bump_counter(AUTHORS_VERSION_KEY)
+
+
+def get_sidebar_stamp(*names) -> str:
+    """
+    Возвращает составной штамп версий данных сайдбаров (categories, tags, top-posts, posts)
+    для ключа кеша. Штампы хранятся в кеше sidebar и обычно читаются из памяти процесса
+    """
+
+    keys = [SIDEBAR_STAMP_KEY.format(name=name) for name in names]
+    stamps = get_counters(keys, cache=caches['sidebar'])
+    return '.'.join(str(stamps[key]) for key in keys)
+
+
+def bump_sidebar_stamps(*names) -> None:
+    """
+    Делает недействительными кешированные данные сайдбаров с указанными штампами
+    и кешированные страницы с сайдбарами (метка sidebar): штампы входят и в версию
+    страницы для условных GET-запросов, и в ее кешированный HTML
+    """
+
+    for name in names:
+        bump_counter(SIDEBAR_STAMP_KEY.format(name=name), cache=caches['sidebar'])
+    purge_pages('sidebar')
+
+
+def posts_changed(post_ids=()) -> None:
+    """Сбрасывает кеши, зависящие от набора опубликованных постов и от постов post_ids"""
+
+    bump_posts_corpus_version()
+    bump_sidebar_stamps('categories', 'top-posts', 'posts')
+    purge_pages('posts', *(f'post:{pk}' for pk in post_ids))
+
+
+def purge_pages(*tags) -> None:
+    """Удаляет из кеша страницы, помеченные любой из меток (posts, post:<id>, sidebar)"""
+
+    keys = redis_services.pop_tagged_pages(tags)
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def get_cached_pks(queryset, timeout: int):
+    """
+    Возвращает pk объектов запроса, кешируемые на timeout секунд.
+    Ключ включает SQL запроса и поколения всех таблиц, участвующих в нем.
+    Возвращает None, если запрос заведомо пуст
+    """
+
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    tables = sorted({alias.table_name for alias in queryset.query.alias_map.values()})
+    generations = get_generations(tables)
+    key = make_key('objects', sql, params, *(generations[table] for table in tables))
+    pks = cache.get(key)
+    if pks is None:
+        pks = list(queryset.values_list('pk', flat=True))
+        cache.set(key, pks, timeout)
+    return pks
+
+
+def get_or_compute(key: str, compute: callable, timeout: int, cache=cache, beta: float = 1.0):
+    """
+    Возвращает значение из кеша или вычисляет его, защищая от лавины пересчетов:
+
+    - значение хранится вместе со временем вычисления и логическим сроком годности,
+      физически запись живет еще CACHE_STALE_TIMEOUT секунд после него;
+    - незадолго до истечения срока значение пересчитывается досрочно с вероятностью,
+      растущей к сроку и пропорциональной времени вычисления (XFetch, коэффициент beta);
+    - пересчитывает только процесс, захвативший блокировку (redis_services.acquire_lock),
+      остальные получают текущее (возможно, устаревшее) значение. Блокировка снимается
+      только своим владельцем, даже если пересчет длился дольше CACHE_LOCK_TIMEOUT;
+    - при полном промахе процессы, не получившие блокировку, ждут результат не дольше
+      CACHE_LOCK_WAIT и вычисляют значение сами, только если он так и не появился
+    """
+
+    lock_key = cache.make_key(key)
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if time.time() - delta * beta * math.log(1 - random.random()) < expires_at:
+            return value
+        token = redis_services.acquire_lock(lock_key, settings.CACHE_LOCK_TIMEOUT)
+        if token is None:
+            return value
+    else:
+        token = redis_services.acquire_lock(lock_key, settings.CACHE_LOCK_TIMEOUT)
+        if token is None:
+            deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+            return compute()
+
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        cache.set(key, (value, delta, time.time() + timeout), timeout + settings.CACHE_STALE_TIMEOUT)
+    finally:
+        redis_services.release_lock(lock_key, token)
+    return value
+
+
+def make_etag(*parts) -> str:
+    """Формирует ETag ответа из частей версии ресурса"""
+
+    return quote_etag(make_key('etag', *parts).partition(':')[2])
+
+
+def get_not_modified_response(request, etag: str = None, last_modified=None):
+    """
+    Возвращает ответ 304 (или 412), если ресурс у клиента не изменился
+    по If-None-Match / If-Modified-Since, иначе None
+    """
+
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag)
+    return response
+
+
+def set_validators(response, etag: str = None, last_modified=None):
+    """Добавляет в ответ заголовки ETag и Last-Modified"""
+
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    if last_modified:
+        response.headers.setdefault('Last-Modified', http_date(int(last_modified.timestamp())))
+    return response
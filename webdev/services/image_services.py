@@ -0,0 +1,103 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.fields import ThumbnailerImageField
+from easy_thumbnails.files import generate_all_aliases
+
+
+def get_resized_fields(model) -> dict:
+    """
+    Возвращает поля изображений модели, которые обрабатываются после загрузки,
+    и параметры easy_thumbnails для уменьшения исходника (UPLOAD_RESIZE_OPTIONS)
+    """
+
+    prefix = f'{model._meta.label}.'
+    return {key[len(prefix):]: options
+            for key, options in settings.UPLOAD_RESIZE_OPTIONS.items()
+            if key.startswith(prefix)}
+
+
+def get_processed_flag(field_name: str) -> str:
+    """Имя поля-признака завершенной обработки изображения"""
+
+    return f'{field_name}_processed'
+
+
+def is_processed(fieldfile) -> bool:
+    """Обработано ли изображение (изображения полей без обработки считаются обработанными)"""
+
+    return getattr(fieldfile.instance, get_processed_flag(fieldfile.field.name), True)
+
+
+def mark_uploaded_images(instance) -> list:
+    """
+    Вызывается перед сохранением объекта: помечает новые загруженные изображения
+    необработанными и возвращает имена их полей. Файлы сохраняются как есть
+    """
+
+    uploaded = []
+    for field_name in get_resized_fields(type(instance)):
+        fieldfile = getattr(instance, field_name)
+        if fieldfile and not fieldfile._committed:
+            setattr(instance, get_processed_flag(field_name), False)
+            uploaded.append(field_name)
+    return uploaded
+
+
+def get_image_fields() -> list:
+    """Возвращает пары (модель, имя поля) всех полей ThumbnailerImageField проекта"""
+
+    return [(model, field.name)
+            for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if isinstance(field, ThumbnailerImageField)]
+
+
+def generate_aliases(fieldfile) -> int:
+    """
+    Создает миниатюры изображения по всем алиасам THUMBNAIL_ALIASES, которые
+    иначе создавались бы при первом выводе страницы. Возвращает количество алиасов
+    """
+
+    if not fieldfile:
+        return 0
+    generate_all_aliases(fieldfile, include_global=True)
+    return len(aliases.all(fieldfile, include_global=True))
+
+
+def resize_uploaded_image(model, pk: int, field_name: str, name: str) -> bool:
+    """
+    Уменьшает загруженное изображение name по параметрам UPLOAD_RESIZE_OPTIONS,
+    создает его миниатюры по всем алиасам и заменяет им исходный файл.
+    Если за время обработки объект удален или изображение заменено новой
+    загрузкой, результат отбрасывается. Возвращает True, если изображение заменено
+    """
+
+    instance = model._default_manager.filter(pk=pk).only('pk', field_name).first()
+    if instance is None:
+        return False
+    fieldfile = getattr(instance, field_name)
+    if fieldfile.name != name:
+        return False
+
+    options = dict(get_resized_fields(model)[field_name])
+    options.setdefault('quality', fieldfile.thumbnail_quality)
+    thumbnail = fieldfile.generate_thumbnail(options)
+    # расширение может измениться, если формат исходника не поддерживается для сохранения
+    base, ext = os.path.splitext(name)
+    new_name = fieldfile.storage.save(base + os.path.splitext(thumbnail.name)[1], thumbnail)
+    resized = fieldfile.field.attr_class(instance, fieldfile.field, new_name)
+    # миниатюры создаются до снятия заглушки, страницы не создают их при выводе
+    generate_aliases(resized)
+
+    updated = model._default_manager.filter(pk=pk, **{field_name: name})\
+                                    .update(**{field_name: new_name, get_processed_flag(field_name): True})
+    fieldfile.close()
+    if updated:
+        fieldfile.storage.delete(name)
+    else:
+        resized.delete_thumbnails()
+        resized.storage.delete(new_name)
+    return bool(updated)
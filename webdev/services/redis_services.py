@@ -1,19 +1,428 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
 import redis
 
 from django.conf import settings
+from django.utils import timezone
 
 r = redis.Redis(host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 db=settings.REDIS_DB)
 
+# Хеш приращений просмотров, еще не перенесенных в Post.view_count
+PENDING_VIEWS_KEY = 'posts:views:pending'
+PROCESSING_VIEWS_KEY = 'posts:views:processing'
+
+# Лента подписок пользователя: sorted set id постов с оценкой publish (timestamp),
+# признак построенной ленты, признак поставленного в очередь построения
+# и множество авторов, посты которых в ленты не рассылаются
+TIMELINE_KEY = 'timeline:{user_id}'
+TIMELINE_READY_KEY = 'timeline:{user_id}:ready'
+TIMELINE_REBUILD_KEY = 'timeline:{user_id}:rebuild'
+TIMELINE_CELEBRITIES_KEY = 'timeline:celebrities'
+
+# Множество ключей кешированных страниц, зависящих от объекта с данной меткой
+PAGE_TAG_KEY = 'page:tag:{tag}'
+
+# Еженедельная рассылка: текст письма запуска, id завершенных пачек
+# пользователей, захват пачки задачей (хранит id задачи) и адреса,
+# которым письмо пачки уже отправлено
+DIGEST_MESSAGE_KEY = 'digest:{run_id}:message'
+DIGEST_DONE_KEY = 'digest:{run_id}:done'
+DIGEST_BATCH_KEY = 'digest:{run_id}:batch:{start}'
+DIGEST_SENT_KEY = 'digest:{run_id}:batch:{start}:sent'
+
+# Блокировка пересчета значения кеша: хранит токен захватившего ее процесса
+CACHE_LOCK_KEY = 'lock:{key}'
+
+# Удаляет блокировку, только если она все еще принадлежит процессу с данным токеном
+_release_lock_script = r.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+# Буфер просмотров и посетителей текущего процесса (используется при VIEWS_BUFFER_ENABLED)
+_views_buffer = Counter()
+_visitors_buffer = defaultdict(set)
+_views_buffer_lock = threading.Lock()
+# поток процесса, сбрасывающий буфер раз в VIEWS_BUFFER_FLUSH_INTERVAL сек.
+_views_flush_thread = None
+
+
+def incr_views(post_id: int, visitor: str = None) -> None:
+    """
+    Увеличивает счетчик просмотров конкретного поста при его просмотре.
+    Если передан идентификатор посетителя, учитывает его в счетчике уникальных просмотров
+    """
+
+    if not settings.UNIQUE_VIEWS_ENABLED:
+        visitor = None
+    if settings.VIEWS_BUFFER_ENABLED:
+        _buffer_views(post_id, visitor)
+    else:
+        _write_views({post_id: 1}, {post_id: {visitor}} if visitor else {})
+
+
+def _buffer_views(post_id: int, visitor: str = None) -> None:
+    """
+    Накапливает просмотр в буфере процесса и сбрасывает буфер в Redis
+    при превышении порога по количеству просмотров. По времени буфер
+    сбрасывает поток _flush_views_periodically, в том числе в простаивающем процессе
+    """
+
+    global _views_flush_thread
 
-def incr_views(post_id: int) -> None:
-    """Увеличивает счетчик просмотров конкретного поста при его просмотре"""
+    with _views_buffer_lock:
+        _views_buffer[post_id] += 1
+        if visitor:
+            _visitors_buffer[post_id].add(visitor)
+        flush_is_due = _views_buffer.total() >= settings.VIEWS_BUFFER_MAX_SIZE
+        # после fork поток родительского процесса в дочернем не работает
+        if _views_flush_thread is None or _views_flush_thread.pid != os.getpid():
+            _views_flush_thread = threading.Thread(target=_flush_views_periodically,
+                                                   name='views-buffer-flush',
+                                                   daemon=True)
+            _views_flush_thread.pid = os.getpid()
+            _views_flush_thread.start()
+    if flush_is_due:
+        flush_views()
 
-    r.incr(f'post:{post_id}:views')
+
+def _flush_views_periodically() -> None:
+    """Сбрасывает буфер просмотров процесса в Redis раз в VIEWS_BUFFER_FLUSH_INTERVAL сек."""
+
+    while True:
+        time.sleep(settings.VIEWS_BUFFER_FLUSH_INTERVAL)
+        try:
+            flush_views()
+        except redis.RedisError:
+            # просмотры остались в буфере и будут отправлены при следующем сбросе
+            pass
+
+
+def flush_views() -> None:
+    """Сбрасывает накопленные в буфере процесса просмотры в Redis одним конвейером"""
+
+    global _views_buffer, _visitors_buffer
+
+    with _views_buffer_lock:
+        views, _views_buffer = _views_buffer, Counter()
+        visitors, _visitors_buffer = _visitors_buffer, defaultdict(set)
+    if not views:
+        return
+    try:
+        _write_views(views, visitors)
+    except redis.RedisError:
+        # возвращаем просмотры в буфер, чтобы не потерять их до следующего сброса
+        with _views_buffer_lock:
+            _views_buffer.update(views)
+            for post_id, post_visitors in visitors.items():
+                _visitors_buffer[post_id].update(post_visitors)
+        raise
+
+
+def _write_views(views: dict, visitors: dict) -> None:
+    """
+    Записывает приращения просмотров в счетчики постов и в хеш несинхронизированных просмотров,
+    а посетителей - в HyperLogLog уникальных просмотров за все время и за текущий день
+    """
+
+    today = timezone.localdate().isoformat()
+    pipe = r.pipeline(transaction=False)
+    for post_id, count in views.items():
+        pipe.incrby(f'post:{post_id}:views', count)
+        pipe.hincrby(PENDING_VIEWS_KEY, post_id, count)
+    for post_id, post_visitors in visitors.items():
+        day_key = f'post:{post_id}:unique:{today}'
+        pipe.pfadd(f'post:{post_id}:unique', *post_visitors)
+        pipe.pfadd(day_key, *post_visitors)
+        pipe.expire(day_key, settings.UNIQUE_VIEWS_DAY_TTL)
+    pipe.execute()
+
+
+atexit.register(flush_views)
 
 
 def get_views(pk: int) -> int:
     """Возвращает значение счетчика просмотров конкретного поста"""
 
-    return int(r.get(f'post:{pk}:views')) if r.get(f'post:{pk}:views') else 0
+    views = r.get(f'post:{pk}:views')
+    return int(views) if views else 0
+
+
+def get_views_many(ids) -> dict:
+    """Возвращает значения счетчиков просмотров нескольких постов одним запросом MGET"""
+
+    ids = list(ids)
+    if not ids:
+        return {}
+    values = r.mget([f'post:{pk}:views' for pk in ids])
+    return {pk: int(views) if views else 0 for pk, views in zip(ids, values)}
+
+
+def get_unique_views(pk: int, days: int = None) -> int:
+    """
+    Возвращает приблизительное количество уникальных посетителей поста
+    за все время или за последние days дней
+    """
+
+    if days is None:
+        return r.pfcount(f'post:{pk}:unique')
+    today = timezone.localdate()
+    day_keys = [f'post:{pk}:unique:{(today - timedelta(days=day)).isoformat()}'
+                for day in range(days)]
+    return r.pfcount(*day_keys)
+
+
+def get_unique_views_many(ids) -> dict:
+    """Возвращает количество уникальных посетителей нескольких постов одним конвейером PFCOUNT"""
+
+    ids = list(ids)
+    if not ids:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for pk in ids:
+        pipe.pfcount(f'post:{pk}:unique')
+    return dict(zip(ids, pipe.execute()))
+
+
+def get_pending_views() -> dict:
+    """
+    Забирает приращения просмотров, накопленные с последней синхронизации с БД.
+    Если предыдущая синхронизация не завершилась, повторно возвращает ее данные
+    """
+
+    if not r.exists(PROCESSING_VIEWS_KEY):
+        try:
+            r.rename(PENDING_VIEWS_KEY, PROCESSING_VIEWS_KEY)
+        except redis.ResponseError:
+            # новых просмотров не было
+            return {}
+    pending = r.hgetall(PROCESSING_VIEWS_KEY)
+    return {int(pk): int(count) for pk, count in pending.items()}
+
+
+def clear_pending_views() -> None:
+    """Подтверждает перенос приращений просмотров в БД"""
+
+    r.delete(PROCESSING_VIEWS_KEY)
+
+
+def set_views_many(views: dict) -> None:
+    """Устанавливает значения счетчиков просмотров нескольких постов"""
+
+    if views:
+        r.mset({f'post:{pk}:views': count for pk, count in views.items()})
+
+
+def push_to_timelines(user_ids, post_id: int, score: float) -> None:
+    """
+    Добавляет пост в построенные ленты пользователей одним конвейером,
+    оставляя в каждой ленте не более TIMELINE_MAX_LENGTH последних постов
+    """
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(TIMELINE_READY_KEY.format(user_id=user_id))
+    ready = pipe.execute()
+
+    pipe = r.pipeline(transaction=False)
+    for user_id, is_ready in zip(user_ids, ready):
+        # непостроенная лента будет собрана из БД целиком при первом чтении
+        if not is_ready:
+            continue
+        key = TIMELINE_KEY.format(user_id=user_id)
+        pipe.zadd(key, {post_id: score})
+        pipe.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+        pipe.expire(key, settings.TIMELINE_TTL)
+    pipe.execute()
+
+
+def set_timeline(user_id: int, posts: dict) -> None:
+    """Заменяет ленту пользователя переданными постами {id: оценка} и помечает ее построенной"""
+
+    key = TIMELINE_KEY.format(user_id=user_id)
+    ready_key = TIMELINE_READY_KEY.format(user_id=user_id)
+    pipe = r.pipeline()
+    pipe.delete(key)
+    if posts:
+        pipe.zadd(key, posts)
+        pipe.expire(key, settings.TIMELINE_TTL)
+    pipe.set(ready_key, 1, ex=settings.TIMELINE_TTL)
+    pipe.delete(TIMELINE_REBUILD_KEY.format(user_id=user_id))
+    pipe.execute()
+
+
+def get_timeline(user_id: int):
+    """Возвращает id постов ленты пользователя от новых к старым или None, если лента не построена"""
+
+    pipe = r.pipeline(transaction=False)
+    pipe.exists(TIMELINE_READY_KEY.format(user_id=user_id))
+    pipe.zrevrange(TIMELINE_KEY.format(user_id=user_id), 0, -1)
+    ready, post_ids = pipe.execute()
+    if not ready:
+        return None
+    return [int(pk) for pk in post_ids]
+
+
+def drop_timeline(user_id: int) -> None:
+    """
+    Удаляет ленту пользователя, она будет построена заново при следующем чтении.
+    Признак построения тоже снимается: уже идущее построение могло прочитать старые подписки
+    """
+
+    r.delete(TIMELINE_KEY.format(user_id=user_id),
+             TIMELINE_READY_KEY.format(user_id=user_id),
+             TIMELINE_REBUILD_KEY.format(user_id=user_id))
+
+
+def claim_timeline_rebuild(user_id: int) -> bool:
+    """
+    Отмечает построение ленты поставленным в очередь. Возвращает False, если оно
+    уже в очереди: повторные чтения непостроенной ленты не ставят новых задач.
+    Отметка снимается построением ленты или по истечении TIMELINE_REBUILD_TIMEOUT
+    """
+
+    return bool(r.set(TIMELINE_REBUILD_KEY.format(user_id=user_id), 1,
+                      nx=True, ex=settings.TIMELINE_REBUILD_TIMEOUT))
+
+
+def get_celebrities() -> set:
+    """Возвращает id авторов, посты которых подмешиваются в ленты при чтении"""
+
+    return {int(pk) for pk in r.smembers(TIMELINE_CELEBRITIES_KEY)}
+
+
+def set_celebrity(user_id: int, is_celebrity: bool) -> None:
+    """Включает автора в множество авторов с рассылкой при чтении или исключает из него"""
+
+    if is_celebrity:
+        r.sadd(TIMELINE_CELEBRITIES_KEY, user_id)
+    else:
+        r.srem(TIMELINE_CELEBRITIES_KEY, user_id)
+
+
+def get_digest_message(run_id: str):
+    """Возвращает текст письма рассылки run_id или None, если он еще не сформирован"""
+
+    message = r.get(DIGEST_MESSAGE_KEY.format(run_id=run_id))
+    return message.decode() if message is not None else None
+
+
+def set_digest_message(run_id: str, message: str) -> str:
+    """
+    Сохраняет текст письма рассылки run_id, если он еще не сохранен,
+    и возвращает сохраненный текст: все пачки запуска получают одно письмо
+    """
+
+    key = DIGEST_MESSAGE_KEY.format(run_id=run_id)
+    r.set(key, message, nx=True, ex=settings.DIGEST_TTL)
+    return r.get(key).decode()
+
+
+def get_done_digest_batches(run_id: str) -> set:
+    """Возвращает начала диапазонов pk пачек, уже отправленных в рамках рассылки run_id"""
+
+    return {int(start) for start in r.smembers(DIGEST_DONE_KEY.format(run_id=run_id))}
+
+
+def claim_digest_batch(run_id: str, start: int, owner: str) -> bool:
+    """
+    Захватывает пачку для отправки задачей owner. Возвращает False, если пачка уже отправлена
+    или отправляется другой задачей. Повторно доставленная брокером задача с тем же owner
+    захват получает. Захват снимается по истечении DIGEST_BATCH_CLAIM_TIMEOUT
+    """
+
+    if r.sismember(DIGEST_DONE_KEY.format(run_id=run_id), start):
+        return False
+    key = DIGEST_BATCH_KEY.format(run_id=run_id, start=start)
+    if r.set(key, owner, nx=True, ex=settings.DIGEST_BATCH_CLAIM_TIMEOUT):
+        return True
+    return r.get(key) == owner.encode()
+
+
+def release_digest_batch(run_id: str, start: int, owner: str) -> None:
+    """Снимает захват пачки, не отправленной из-за ошибки, если он принадлежит задаче owner"""
+
+    _release_lock_script(keys=[DIGEST_BATCH_KEY.format(run_id=run_id, start=start)], args=[owner])
+
+
+def get_sent_digest_emails(run_id: str, start: int) -> set:
+    """Возвращает адреса, которым письмо пачки уже отправлено"""
+
+    return {email.decode() for email in r.smembers(DIGEST_SENT_KEY.format(run_id=run_id, start=start))}
+
+
+def add_sent_digest_email(run_id: str, start: int, email: str) -> None:
+    """Отмечает отправку письма пачки адресату"""
+
+    sent_key = DIGEST_SENT_KEY.format(run_id=run_id, start=start)
+    pipe = r.pipeline()
+    pipe.sadd(sent_key, email)
+    pipe.expire(sent_key, settings.DIGEST_TTL)
+    pipe.execute()
+
+
+def complete_digest_batch(run_id: str, start: int) -> None:
+    """Отмечает пачку отправленной"""
+
+    done_key = DIGEST_DONE_KEY.format(run_id=run_id)
+    pipe = r.pipeline()
+    pipe.sadd(done_key, start)
+    pipe.expire(done_key, settings.DIGEST_TTL)
+    pipe.delete(DIGEST_BATCH_KEY.format(run_id=run_id, start=start),
+                DIGEST_SENT_KEY.format(run_id=run_id, start=start))
+    pipe.execute()
+
+
+def acquire_lock(key: str, timeout: int):
+    """Захватывает блокировку на timeout секунд. Возвращает токен владельца или None, если она занята"""
+
+    token = uuid.uuid4().hex
+    if r.set(CACHE_LOCK_KEY.format(key=key), token, nx=True, ex=timeout):
+        return token
+    return None
+
+
+def release_lock(key: str, token: str) -> None:
+    """
+    Снимает блокировку, если она еще принадлежит владельцу token: истекшую
+    и захваченную другим процессом блокировку не снимает
+    """
+
+    _release_lock_script(keys=[CACHE_LOCK_KEY.format(key=key)], args=[token])
+
+
+def tag_page(key: str, tags, timeout: int) -> None:
+    """Запоминает ключ кешированной страницы в множествах ее меток"""
+
+    pipe = r.pipeline(transaction=False)
+    for tag in tags:
+        tag_key = PAGE_TAG_KEY.format(tag=tag)
+        pipe.sadd(tag_key, key)
+        pipe.expire(tag_key, timeout)
+    pipe.execute()
+
+
+def pop_tagged_pages(tags) -> set:
+    """Возвращает ключи кешированных страниц с любой из меток и удаляет множества меток"""
+
+    tag_keys = [PAGE_TAG_KEY.format(tag=tag) for tag in tags]
+    if not tag_keys:
+        return set()
+    pipe = r.pipeline()
+    pipe.sunion(tag_keys)
+    pipe.delete(*tag_keys)
+    keys, _ = pipe.execute()
+    return {key.decode() for key in keys}
@@ -0,0 +1,137 @@
+from html import unescape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Func, Value
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from post.models import Post
+from services import cache_services
+from services.services import POST_HEAVY_FIELDS
+
+# Служебные маркеры начала и конца совпадения во фрагменте SearchHeadline.
+# Заменяются на <mark> только после экранирования текста поста
+HEADLINE_START_SEL = '\ue000'
+HEADLINE_STOP_SEL = '\ue001'
+
+
+def get_search_query(query: str) -> SearchQuery:
+    """Возвращает поисковый запрос PostgreSQL в конфигурации сайта"""
+
+    return SearchQuery(query, config=settings.SEARCH_CONFIG)
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к виду, не влияющему на результат поиска: нижний регистр, одиночные пробелы"""
+
+    return ' '.join(query.lower().split())
+
+
+def search_post_ids(query: str) -> tuple:
+    """
+    Возвращает id опубликованных постов, найденных по запросу,
+    в порядке убывания релевантности, и признак нечеткого поиска.
+    Если полнотекстовый поиск ничего не нашел, посты ищутся по похожести
+    заголовка на запрос (опечатки). Количество результатов ограничено
+    SEARCH_RESULTS_LIMIT, тела постов не загружаются.
+    Результат кешируется по нормализованному запросу и версии корпуса постов
+    """
+
+    query = normalize_query(query)
+    key = cache_services.make_key('search', cache_services.get_posts_corpus_version(), query)
+    result = cache.get(key)
+    if result is None:
+        post_ids = full_text_search_post_ids(query)
+        fuzzy = not post_ids
+        if fuzzy:
+            post_ids = fuzzy_search_post_ids(query)
+        result = (post_ids, fuzzy)
+        cache.set(key, result, settings.SEARCH_CACHE_TIMEOUT)
+    return result
+
+
+def full_text_search_post_ids(query: str) -> list:
+    """Поиск по поисковому вектору поста, упорядоченный по SearchRank"""
+
+    search_query = get_search_query(query)
+    return list(Post.published.filter(search_vector=search_query)
+                              .annotate(rank=SearchRank(F('search_vector'), search_query))
+                              .order_by('-rank', '-publish', '-id')
+                              .values_list('id', flat=True)[:settings.SEARCH_RESULTS_LIMIT])
+
+
+def fuzzy_search_post_ids(query: str) -> list:
+    """
+    Поиск по триграммной похожести запроса на слова заголовка.
+    Условие title %> запрос обслуживается индексом post_title_trgm_idx
+    """
+
+    return list(Post.published.filter(title__trigram_word_similar=query)
+                              .annotate(similarity=TrigramWordSimilarity(query, 'title'))
+                              .order_by('-similarity', '-publish', '-id')
+                              .values_list('id', flat=True)[:settings.SEARCH_RESULTS_LIMIT])
+
+
+def autocomplete_posts(query: str) -> list:
+    """
+    Возвращает до SEARCH_AUTOCOMPLETE_LIMIT словарей id/title/url опубликованных
+    постов, заголовок которых содержит запрос. Условие UPPER(title) LIKE
+    обслуживается индексом post_title_upper_trgm_idx, тела постов не загружаются,
+    результат кешируется по версии корпуса постов
+    """
+
+    query = normalize_query(query)
+    if len(query) < settings.SEARCH_AUTOCOMPLETE_MIN_LENGTH:
+        return []
+
+    key = cache_services.make_key('autocomplete', cache_services.get_posts_corpus_version(), query)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        posts = Post.published.filter(title__icontains=query)\
+                              .annotate(similarity=TrigramWordSimilarity(query, 'title'))\
+                              .order_by('-similarity', '-publish', '-id')\
+                              .only('id', 'title', 'slug', 'publish')[:settings.SEARCH_AUTOCOMPLETE_LIMIT]
+        suggestions = [{'id': post.id, 'title': post.title, 'url': post.get_absolute_url()}
+                       for post in posts]
+        cache.set(key, suggestions, settings.SEARCH_CACHE_TIMEOUT)
+    return suggestions
+
+
+def get_search_results(query: str, post_ids) -> list:
+    """
+    Возвращает посты с переданными id в том же порядке, у каждого поста
+    атрибут headline содержит короткий фрагмент текста с выделенными совпадениями.
+    Фрагмент формируется в БД, тело поста целиком в приложение не передается
+    """
+
+    post_ids = list(post_ids)
+    if not post_ids:
+        return []
+
+    plain_body = Func(F('body'), Value('<[^>]*>'), Value(' '), Value('g'),
+                      function='regexp_replace')
+    posts = Post.published.filter(id__in=post_ids)\
+                          .select_related('author', 'cat')\
+                          .defer(*POST_HEAVY_FIELDS)\
+                          .annotate(headline=SearchHeadline(plain_body,
+                                                            get_search_query(query),
+                                                            config=settings.SEARCH_CONFIG,
+                                                            start_sel=HEADLINE_START_SEL,
+                                                            stop_sel=HEADLINE_STOP_SEL,
+                                                            max_words=settings.SEARCH_HEADLINE_MAX_WORDS,
+                                                            min_words=settings.SEARCH_HEADLINE_MIN_WORDS))
+    posts = {post.id: post for post in posts}
+    results = [posts[post_id] for post_id in post_ids if post_id in posts]
+    for post in results:
+        post.headline = highlight(post.headline)
+    return results
+
+
+def highlight(headline: str) -> str:
+    """Экранирует фрагмент текста поста и выделяет совпадения тегом <mark>"""
+
+    headline = escape(unescape(headline or ''))
+    return mark_safe(headline.replace(HEADLINE_START_SEL, '<mark>')
+                             .replace(HEADLINE_STOP_SEL, '</mark>'))
@@ -1,13 +1,34 @@
+import hashlib
+
 from django.contrib.auth.models import Group
-from django.db.models import Manager, QuerySet
+from django.db import transaction
+from django.db.models import Count, F, Manager, Max, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 
 from slugify import slugify
 
 # from api.serializers import TagListSerializer
 from post.forms import PostForm, CommentForm
+from post.models import Post, Comment, Category, Tag
 from post.tasks import *
+from services import cache_services, redis_services
+
+# Тяжелые текстовые колонки поста, которые не нужны при выводе списков постов
+POST_HEAVY_FIELDS = ('body', 'search_vector')
+
+# Проекция постов для списков (HTML, API, карта сайта, профиль): автор и категория
+# одним запросом, только выводимые в списках колонки, без POST_HEAVY_FIELDS.
+# Передается в all_objects / filter_objects / following_posts как **POST_LIST_PROJECTION
+POST_LIST_PROJECTION = {
+    'select_related': ('cat', 'author'),
+    'only': ('title', 'slug', 'excerpt', 'title_image', 'title_image_processed', 'publish', 'created', 'updated',
+             'comment_count', 'author__username', 'author__id', 'cat__cat_title', 'cat__slug'),
+}
 
+# Поля автора, выводимые вместе с постами: только их изменение меняет
+# кешированные запросы постов с соединением таблицы пользователей
+POST_AUTHOR_FIELDS = ('username',)
 
 def only_objects_decorator(func: callable) -> callable:
     """Позволяет функциям, обращающимся к БД, принимать параметр only"""
@@ -36,9 +57,31 @@ def prefetch_related_objects_decorator(func: callable) -> callable:
     return prefetch_related_objects_wrapper
 
 
+def cache_objects_decorator(func: callable) -> callable:
+    """
+    Позволяет функциям, обращающимся к БД, принимать параметр cache - время
+    кеширования (сек.) pk найденных объектов. Сами объекты выбираются по pk,
+    кеш сбрасывается при изменении любой таблицы запроса (см. cache_services.get_cached_pks,
+    поколения таблиц увеличиваются в post.signals). Имеет смысл только для запросов
+    с соединениями и агрегатами: запрос к одной таблице не дешевле повторной выборки по pk
+    """
+
+    def cache_objects_wrapper(objects, cache=None, *args, **kwargs):
+        queryset = func(objects, *args, **kwargs)
+        if cache is None:
+            return queryset
+        pks = cache_services.get_cached_pks(queryset, cache)
+        if pks is None:
+            return queryset
+        return objects.filter(pk__in=pks)
+
+    return cache_objects_wrapper
+
+
 @only_objects_decorator
 @prefetch_related_objects_decorator
 @select_related_objects_decorator
+@cache_objects_decorator
 def all_objects(objects: Manager, count: int = None) -> QuerySet:
     """Возвращает все объекты"""
 
@@ -50,18 +93,81 @@ def all_objects(objects: Manager, count: int = None) -> QuerySet:
 @only_objects_decorator
 @prefetch_related_objects_decorator
 @select_related_objects_decorator
+@cache_objects_decorator
 def filter_objects(objects: Manager, **kwargs) -> QuerySet:
     """Возвращает отфильтрованные объекты"""
 
     return objects.filter(**kwargs)
 
 
+@only_objects_decorator
+@prefetch_related_objects_decorator
+@select_related_objects_decorator
+def following_posts(objects: Manager, user: User) -> QuerySet:
+    """
+    Возвращает посты авторов, на которых подписан пользователь.
+    id постов берутся из ленты пользователя в Redis, посты авторов с большим
+    количеством подписчиков добавляются при чтении. Если лента еще не построена,
+    посты выбираются по подпискам, а построение ленты ставится в очередь (однократно)
+    """
+
+    following = user.following.all()
+    timeline = redis_services.get_timeline(user.pk)
+    if timeline is None:
+        if redis_services.claim_timeline_rebuild(user.pk):
+            rebuild_timeline.delay(user.pk)
+        return objects.filter(author__in=following)
+    celebrity_ids = redis_services.get_celebrities()
+    celebrities = []
+    if celebrity_ids:
+        celebrities = list(following.filter(pk__in=celebrity_ids).values_list('pk', flat=True))
+    if not timeline and not celebrities:
+        return objects.none()
+    return objects.filter(Q(pk__in=timeline) | Q(author__in=celebrities))
+
+
 def get_instance_by_unique_field(model, **kwargs):
     """Возвращает объект из БД по уникальному полю"""
 
     return get_object_or_404(model, **kwargs)
 
 
+def get_post_validators(objects: Manager, **kwargs):
+    """
+    Возвращает id поста, версию поста вместе с комментариями, категориями и тегами
+    и время последнего изменения поста или его комментариев для условных GET-запросов.
+    Тело поста не загружается. Возвращает None, если пост не найден
+    """
+
+    try:
+        post = objects.filter(**kwargs)\
+                      .annotate(comments_updated=Max('comments__updated'))\
+                      .values('pk', 'updated', 'comment_count', 'comments_updated')\
+                      .first()
+    except (TypeError, ValueError):
+        return None
+    if post is None:
+        return None
+    tables = sorted(model._meta.db_table for model in (Category, Tag, Post.tags.through))
+    generations = cache_services.get_generations(tables)
+    last_modified = max(filter(None, (post['updated'], post['comments_updated'])))
+    return {'pk': post['pk'],
+            'version': (post['pk'], post['updated'].isoformat(), post['comment_count'],
+                        post['comments_updated'], *(generations[table] for table in tables)),
+            'last_modified': last_modified}
+
+
+def get_visitor_id(request) -> str:
+    """Возвращает идентификатор посетителя для подсчета уникальных просмотров"""
+
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = forwarded_for.split(',')[0].strip() if forwarded_for else request.META.get('REMOTE_ADDR', '')
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return 'anon:' + hashlib.md5(f'{ip}|{user_agent}'.encode()).hexdigest()
+
+
 def create_post(form: PostForm, user: User) -> None:
     """Создает объект модели Post"""
 
@@ -73,13 +179,81 @@ def create_post(form: PostForm, user: User) -> None:
     post_created.delay(post.slug)
 
 
+def create_post_serializer(serializer, user) -> None:
+    """Создает объект модели Post из данных API"""
+
+    serializer.save(author=user, slug=slugify(serializer.validated_data['title']))
+
+
 def create_comment(form: CommentForm, user, post) -> None:
     """Создает объект модели Comment"""
 
     comment = form.save(commit=False)
     comment.author = user
     comment.post_id = post.pk
-    comment.save()
+    with transaction.atomic():
+        comment.save()
+        comment_added(comment)
+
+
+def create_comment_serializer(serializer, user) -> None:
+    """Создает объект модели Comment из данных сериализатора"""
+
+    with transaction.atomic():
+        comment = serializer.save(author=user)
+        comment_added(comment)
+
+
+def update_comment_serializer(serializer, post) -> None:
+    """Изменяет объект модели Comment, при переносе комментария пересчитывает счетчики обоих постов"""
+
+    old_post_id = serializer.instance.post_id
+    with transaction.atomic():
+        comment = serializer.save(post=post)
+        if comment.post_id != old_post_id:
+            refresh_comment_counters({old_post_id, comment.post_id})
+
+
+def delete_comment(comment: Comment) -> None:
+    """Удаляет комментарий и пересчитывает счетчики его поста"""
+
+    with transaction.atomic():
+        post_id = comment.post_id
+        comment.delete()
+        refresh_comment_counters({post_id})
+
+
+def delete_comments(comments: QuerySet) -> None:
+    """Удаляет набор комментариев и пересчитывает счетчики их постов"""
+
+    with transaction.atomic():
+        post_ids = set(comments.values_list('post_id', flat=True))
+        comments.delete()
+        refresh_comment_counters(post_ids)
+
+
+def comment_added(comment: Comment) -> None:
+    """Увеличивает счетчик комментариев поста и обновляет время последнего комментария"""
+
+    Post.objects.filter(pk=comment.post_id).update(comment_count=F('comment_count') + 1,
+                                                  last_commented_at=comment.created)
+    cache_services.invalidate(cache_services.bump_generation, Post)
+
+
+def refresh_comment_counters(post_ids=None) -> int:
+    """
+    Пересчитывает денормализованные счетчики комментариев (comment_count, last_commented_at)
+    указанных постов или всех постов, если post_ids не передан
+    """
+
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    posts = Post.objects.all() if post_ids is None else Post.objects.filter(pk__in=post_ids)
+    updated = posts.update(
+        comment_count=Coalesce(Subquery(comments.annotate(total=Count('pk')).values('total')), 0),
+        last_commented_at=Subquery(comments.annotate(last=Max('created')).values('last')),
+    )
+    cache_services.invalidate(cache_services.bump_generation, Post)
+    return updated
 
 
 def create_user(form) -> None:
@@ -99,6 +273,8 @@ def create_tag_serializer(serializer, name: str) -> None:
 def subscribe(user: User, follower: User) -> bool:
     """Осуществляет подписку follower на user"""
 
+    # лента подписчика перестраивается при следующем чтении
+    redis_services.drop_timeline(follower.pk)
     if follower in user.followers.all():
         user.followers.remove(follower)
         return True
@@ -25,4 +25,8 @@ app.conf.beat_schedule = {
                             hour='9',
                             day_of_week='saturday'),
     },
+    'sync-post-views-every-minute': {
+        'task': 'post.tasks.sync_post_views',
+        'schedule': crontab(),
+    },
 }
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'post.apps.PostConfig',
     'account.apps.AccountConfig',
@@ -64,6 +65,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'post.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -100,7 +102,20 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
         # "BACKEND": "django.core.cache.backends.dummy.DummyCache",
         "LOCATION": "redis://127.0.0.1:6379",
-    }
+    },
+    # данные сайдбаров: LRU в памяти процесса перед Redis,
+    # сброс локальных копий в других процессах через Redis pub/sub
+    "sidebar": {
+        "BACKEND": "services.cache_backends.TwoTierCache",
+        "LOCATION": "redis://127.0.0.1:6379",
+        "KEY_PREFIX": "sidebar",
+        "TIMEOUT": 60,
+        "OPTIONS": {
+            "LOCAL_MAX_ENTRIES": 256,
+            "LOCAL_TIMEOUT": 5,
+            "CHANNEL": "sidebar:invalidate",
+        },
+    },
 }
 
 
@@ -128,6 +143,27 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = 'ru'
 
+# Конфигурация полнотекстового поиска PostgreSQL, соответствующая LANGUAGE_CODE
+SEARCH_CONFIG = 'russian'
+
+# Максимальное количество результатов поиска, размер страницы результатов
+# и длина фрагмента текста с выделенными совпадениями (в словах)
+SEARCH_RESULTS_LIMIT = 200
+SEARCH_RESULTS_PER_PAGE = 10
+SEARCH_HEADLINE_MAX_WORDS = 35
+SEARCH_HEADLINE_MIN_WORDS = 15
+
+# Время кеширования id найденных постов (сек.), кеш также сбрасывается
+# при любом изменении опубликованных постов
+SEARCH_CACHE_TIMEOUT = 60 * 10
+
+# Автодополнение заголовков: минимальная длина запроса и количество подсказок
+SEARCH_AUTOCOMPLETE_MIN_LENGTH = 3
+SEARCH_AUTOCOMPLETE_LIMIT = 8
+
+# Длина анонса поста в списках постов (в словах)
+POST_EXCERPT_WORDS = 50
+
 TIME_ZONE = 'Europe/Moscow'
 
 USE_I18N = True
@@ -165,6 +201,17 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 EMAIL_ADMIN = EMAIL_HOST_USER
 
+# Массовые рассылки: количество адресатов в одной задаче (одно SMTP-соединение)
+# и ограничение частоты выполнения таких задач на одном воркере
+MAIL_CHUNK_SIZE = 100
+MAIL_CHUNK_RATE_LIMIT = '30/m'
+
+# Еженедельная рассылка: размер диапазона pk пользователей в одной задаче,
+# время хранения состояния запуска и время захвата пачки воркером (сек.)
+DIGEST_BATCH_SIZE = 1000
+DIGEST_TTL = 60 * 60 * 24 * 8
+DIGEST_BATCH_CLAIM_TIMEOUT = 60 * 30
+
 AUTH_USER_MODEL = 'account.User'
 DEFAULT_USER_IMAGE = 'account/default.png'
 
@@ -178,10 +225,65 @@ THUMBNAIL_ALIASES = {
 
 THUMBNAIL_DEBUG = True
 
+# Загруженные изображения сохраняются как есть, уменьшение, повышение резкости
+# и создание миниатюр по всем алиасам THUMBNAIL_ALIASES выполняет задача Celery
+# process_uploaded_image. Параметры easy_thumbnails для поля 'app_label.Model.поле'
+UPLOAD_RESIZE_OPTIONS = {
+    'post.Post.title_image': {'quality': 95, 'size': (1600, 856), 'sharpen': True},
+    'account.User.photo': {'quality': 98, 'size': (64, 64), 'sharpen': True},
+}
+
+# Заглушки (static), выводимые вместо миниатюр до окончания обработки изображения
+IMAGE_PLACEHOLDERS = {
+    'preview1': 'post/img/placeholder-1600x856.png',
+    'preview2': 'post/img/placeholder-64x64.png',
+}
+
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 
+# Буферизация счетчика просмотров в памяти процесса: приращения отправляются
+# в Redis одним конвейером по достижении порога по количеству, а также фоновым
+# потоком процесса раз в VIEWS_BUFFER_FLUSH_INTERVAL (сек.)
+VIEWS_BUFFER_ENABLED = os.getenv('VIEWS_BUFFER_ENABLED', 'False') == 'True'
+VIEWS_BUFFER_MAX_SIZE = 100
+VIEWS_BUFFER_FLUSH_INTERVAL = 5
+
+# Подсчет уникальных посетителей постов (HyperLogLog), срок хранения дневных счетчиков (сек.)
+UNIQUE_VIEWS_ENABLED = True
+UNIQUE_VIEWS_DAY_TTL = 60 * 60 * 24 * 31
+
+# Защита от лавины пересчетов (cache_services.get_or_compute): время блокировки пересчета,
+# время ожидания результата чужого пересчета и интервал его опроса, время хранения
+# устаревшего значения (сек.). Ожидание добавляется к ответу, поэтому оно короткое
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_WAIT = 0.2
+CACHE_LOCK_POLL_INTERVAL = 0.02
+CACHE_STALE_TIMEOUT = 60 * 5
+
+# Время кеширования страниц для анонимных посетителей (сек.),
+# страницы также удаляются из кеша при изменении объектов, от которых зависят
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Время кеширования pk объектов запросов services.all_objects/filter_objects
+# с параметром cache (сек.), кеш также сбрасывается при изменении таблиц запроса
+OBJECTS_CACHE_TIMEOUT = 60 * 5
+
+# Время кеширования общего количества постов в списках (сек.)
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+
+# Лента подписок в Redis: максимальная длина и время жизни ленты (сек.),
+# порог подписчиков, начиная с которого посты автора не рассылаются по лентам,
+# а подмешиваются при чтении, размер пачки подписчиков при рассылке,
+# время, в течение которого построение ленты не ставится в очередь повторно (сек.)
+TIMELINE_MAX_LENGTH = 500
+TIMELINE_TTL = 60 * 60 * 24 * 7
+TIMELINE_CELEBRITY_THRESHOLD = 1000
+TIMELINE_FAN_OUT_BATCH_SIZE = 1000
+TIMELINE_REBUILD_TIMEOUT = 60
+
 CELERY_BROKER_URL = 'redis://' + REDIS_HOST + ':' + str(REDIS_PORT) + '/0'
 CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + str(REDIS_PORT) + '/0'
 CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
@@ -22,6 +22,7 @@ REDIS_URL = 'redis://cache:6379'
 REDIS_HOST = 'cache'
 REDIS_PORT = 6379
 CACHES['default']['LOCATION'] = REDIS_URL
+CACHES['sidebar']['LOCATION'] = REDIS_URL
 
 CELERY_BROKER_URL = 'redis://' + REDIS_HOST + ':' + str(REDIS_PORT) + '/0'
 CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + str(REDIS_PORT) + '/0'